@@ -0,0 +1,139 @@
+"""
+Measures how format_batch and parse_batch scale with the number of threads.
+
+    python bench/batch.py [--sheets N] [--threads 1,2,4,8] [--python PATH ...]
+
+Runs the benchmark in this interpreter and in every free-threaded (no-GIL)
+interpreter found on PATH (python3.13t, python3.14t), or in the interpreters
+given with --python, and prints the speedup over one thread for each.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import sysconfig
+import time
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+FREE_THREADED = ["python3.13t", "python3.14t"]
+
+
+def gil_enabled():
+    check = getattr(sys, "_is_gil_enabled", None)
+    return check() if check else True
+
+
+def interpreter():
+    kind = (
+        "free-threaded" if sysconfig.get_config_var("Py_GIL_DISABLED") else "standard"
+    )
+    if kind == "free-threaded" and gil_enabled():
+        kind += ", GIL re-enabled"
+    return f"{sys.implementation.name} {sys.version.split()[0]} ({kind})"
+
+
+def sheet(i):
+    words = " ".join(f"w{i}x{j}" for j in range(40 + i % 30))
+    return (
+        f"+--+\n| character {i} |\n+--+\n"
+        f"age -- {i}\nspecies -- seagull\nilk -- bird\n"
+        f"description ----\n  {words}\n"
+        f"memories ----\n  > {words}\n  > second memory of {i}\n"
+    )
+
+
+def best(run, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def measure(sheets, thread_counts, repeat):
+    from cloacal import format as format_module
+    from cloacal.batch import format_batch, parse_batch
+
+    texts = [sheet(i) for i in range(sheets)]
+    results = {"interpreter": interpreter(), "cpus": os.cpu_count(), "runs": []}
+    for threads in thread_counts:
+
+        def run_format(threads=threads):
+            # every run formats from scratch rather than from the wrap cache
+            format_module.wrap_cache_clear()
+            for _ in format_batch(texts, threads=threads):
+                pass
+
+        def run_parse(threads=threads):
+            for _ in parse_batch(texts, threads=threads):
+                pass
+
+        results["runs"].append(
+            {
+                "threads": threads,
+                "format": best(run_format, repeat),
+                "parse": best(run_parse, repeat),
+            }
+        )
+    return results
+
+
+def report(results):
+    print(f"{results['interpreter']}, {results['cpus']} CPUs")
+    base = results["runs"][0]
+    print(
+        f"{'threads':>8} {'format s':>10} {'speedup':>8} {'parse s':>10} {'speedup':>8}"
+    )
+    for run in results["runs"]:
+        print(
+            f"{run['threads']:>8} {run['format']:>10.3f} "
+            f"{base['format'] / run['format']:>7.2f}x {run['parse']:>10.3f} "
+            f"{base['parse'] / run['parse']:>7.2f}x"
+        )
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sheets", type=int, default=2000)
+    parser.add_argument("--threads", default="1,2,4,8")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--python", action="append", help="interpreter to run in")
+    parser.add_argument("--json", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    thread_counts = [int(t) for t in args.threads.split(",")]
+
+    if args.json:
+        print(json.dumps(measure(args.sheets, thread_counts, args.repeat)))
+        return
+
+    others = args.python
+    if others is None:
+        others = [path for path in map(shutil.which, FREE_THREADED) if path]
+        report(measure(args.sheets, thread_counts, args.repeat))
+    env = dict(
+        os.environ, PYTHONPATH=os.pathsep.join([SRC, os.environ.get("PYTHONPATH", "")])
+    )
+    for python in others:
+        command = [python, __file__, "--json", "--sheets", str(args.sheets)]
+        command += ["--threads", args.threads, "--repeat", str(args.repeat)]
+        result = subprocess.run(
+            command, capture_output=True, text=True, env=env, check=False
+        )
+        if result.returncode:
+            print(f"{python}: {result.stderr.strip()}\n", file=sys.stderr)
+            continue
+        report(json.loads(result.stdout))
+    if args.python is None and not others:
+        print(
+            "no free-threaded interpreter found (looked for "
+            f"{', '.join(FREE_THREADED)}); pass one with --python"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Measures format_str on sheets that are already formatted, where it only
+checks them, against parsing and formatting them in full.
+
+    python bench/format_str.py [--sheets N] [--width 44] [--repeat 5]
+"""
+
+import argparse
+import random
+import time
+
+WORDS = [
+    "lorem",
+    "ipsum",
+    "dolor",
+    "sit",
+    "amet",
+    "consectetur",
+    "adipiscing",
+    "elit",
+    "sed",
+    "do",
+    "eiusmod",
+    "tempor",
+    "incididunt",
+    "ut",
+    "labore",
+    "et",
+    "dolore",
+    "magna",
+    "aliqua",
+    "seagull",
+    "bird",
+]
+
+
+def corpus(sheets, width):
+    from cloacal.format import format_dict
+
+    rng = random.Random(0)
+
+    def text(low, high):
+        return " ".join(rng.choice(WORDS) for _ in range(rng.randint(low, high)))
+
+    formatted = []
+    for i in range(sheets):
+        data = {"name": f"character {i}", "age": str(i), "ilk": text(1, 2)}
+        data["species"] = text(1, 3)
+        data["description"] = text(20, 80)
+        data["memories"] = [text(5, 30) for _ in range(rng.randint(1, 6))]
+        formatted.append(format_dict(data, max_line_length=width))
+    return formatted
+
+
+def best(run, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sheets", type=int, default=2000)
+    parser.add_argument("--width", type=int, default=44)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    from cloacal.format import Formatter, format_str, wrap_cache_clear
+    from cloacal.parse import parse
+
+    texts = corpus(args.sheets, args.width)
+    formatter = Formatter(args.width)
+    assert all(format_str(text, args.width) == text for text in texts)
+
+    def full():
+        # without the wrap cache, as for sheets that are seen for the first time
+        wrap_cache_clear()
+        for text in texts:
+            formatter.format(parse(text))
+
+    def checked():
+        for text in texts:
+            format_str(text, args.width)
+
+    full_time = best(full, args.repeat)
+    checked_time = best(checked, args.repeat)
+    size = sum(map(len, texts)) / 1e6
+    print(f"{args.sheets} formatted sheets, {size:.1f} MB, width {args.width}")
+    print(f"{'parse and format':>18} {full_time:8.3f} s {size / full_time:8.1f} MB/s")
+    print(f"{'format_str':>18} {checked_time:8.3f} s {size / checked_time:8.1f} MB/s")
+    print(f"{'speedup':>18} {full_time / checked_time:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,62 @@
 from collections import OrderedDict
-from typing import Any
 
-from .format import format_dict, format_str
-from .parse import parse
+from .format import (
+    Formatter,
+    apply_edits,
+    format_dict,
+    format_range,
+    format_str,
+    format_widths,
+)
+from .parse import Limits, ParseLimitError, parse, parse_lines, parse_sheets
 
+# names imported from their module on first use, so that every `cloacal`
+# command does not pay for modules it does not need
+_LAZY = {
+    "format_batch": "batch",
+    "parse_batch": "batch",
+    "Columns": "columns",
+    "Corpus": "corpus",
+    "load_corpus": "corpus",
+    "ParsedDocument": "document",
+    "load_from_archive": "pack",
+}
 
-def load(path: str) -> OrderedDict[Any, Any]:
-    with open(path, "r") as f:
-        return parse(f.read())
 
+def __getattr__(name):
+    module = _LAZY.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from importlib import import_module
 
-__all__ = ["parse", "format_str", "format_dict"]
+    value = globals()[name] = getattr(import_module(f".{module}", __name__), name)
+    return value
+
+
+def load(path: str) -> OrderedDict[str, str | list[str]]:
+    from .source import open_lines
+
+    with open_lines(path) as lines:
+        return parse_lines(lines)
+
+
+__all__ = [
+    "parse",
+    "parse_lines",
+    "parse_sheets",
+    "parse_batch",
+    "Limits",
+    "ParseLimitError",
+    "format_str",
+    "format_dict",
+    "format_range",
+    "format_widths",
+    "format_batch",
+    "apply_edits",
+    "Formatter",
+    "Corpus",
+    "load_corpus",
+    "Columns",
+    "ParsedDocument",
+    "load_from_archive",
+]
@@ -0,0 +1,68 @@
+import sys
+
+
+def _stdin_format_options(args):
+    """
+    Returns (width, daemon) for a plain `cloacal format [--width N] [--daemon]`
+    reading from stdin, or None when the arguments need the full command line
+    interface.
+    """
+    if not args or args[0] != "format" or sys.stdin is None or sys.stdin.isatty():
+        return None
+    width, daemon = "44", False
+    options = iter(args[1:])
+    for option in options:
+        if option == "--daemon":
+            daemon = True
+        elif option == "--width":
+            width = next(options, "")
+        elif option.startswith("--width="):
+            width = option.removeprefix("--width=")
+        else:
+            return None
+    return (int(width), daemon) if width.isdigit() else None
+
+
+def main():
+    """
+    Entry point for the `cloacal` command.
+
+    Formatting stdin, which editors do on every save, is handled here
+    directly. Everything else is passed on to click in `cloacal.cli`, which
+    is only imported when it is needed.
+    """
+    options = _stdin_format_options(sys.argv[1:])
+    if options is None:
+        from .cli import main as cli_main
+
+        cli_main()
+        return
+
+    width, daemon = options
+    text = sys.stdin.read()
+    formatted = None
+    if daemon:
+        from .daemon import DaemonError, request
+
+        # no daemon, or one that fails to answer: format here instead
+        try:
+            formatted = request("format", text=text, width=width)
+        except (OSError, DaemonError, ValueError):
+            pass
+    if formatted is None:
+        from .format import Formatter
+        from .parse import parse
+
+        formatter = Formatter(max_line_length=width)
+        text = text.strip("\n")
+        if formatter.is_formatted(text):
+            sys.stdout.write(text)
+        else:
+            formatter.write(parse(text), sys.stdout)
+    else:
+        sys.stdout.write(formatted)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Thread-pool batch parsing and formatting for programs that embed cloacal.
+
+`parse_batch` and `format_batch` split their input into chunks, run the
+chunks on a ThreadPoolExecutor and yield the results in input order, one
+chunk at a time, with a bounded number of chunks in flight.
+
+Workers share no mutable state. Parsing only reads module-level compiled
+patterns. Every worker thread formats with its own `Formatter`, and the
+wrap caches the formatters share are lru_caches, which synchronize their
+own updates and only hold immutable tuples. On a free-threaded (no-GIL)
+CPython the workers therefore run in parallel without extra locking.
+"""
+
+import os
+import threading
+from collections import deque
+from collections.abc import Iterable, Iterator, Mapping
+from itertools import batched
+
+from .format import Formatter
+from .parse import parse
+
+_local = threading.local()
+
+
+def _thread_formatter(max_line_length):
+    formatters = getattr(_local, "formatters", None)
+    if formatters is None:
+        formatters = _local.formatters = {}
+    formatter = formatters.get(max_line_length)
+    if formatter is None:
+        formatter = formatters[max_line_length] = Formatter(max_line_length)
+    return formatter
+
+
+def _format_chunk(chunk, max_line_length):
+    formatter = _thread_formatter(max_line_length)
+    return [
+        formatter.format(parse(item) if isinstance(item, str) else item)
+        for item in chunk
+    ]
+
+
+def _parse_chunk(chunk, _):
+    return [parse(text) for text in chunk]
+
+
+def _run(work, items, option, threads, chunk_size, window):
+    if threads is None:
+        threads = os.cpu_count() or 1
+    if threads <= 1:
+        for chunk in batched(items, chunk_size):
+            yield from work(chunk, option)
+        return
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    window = window or 2 * threads
+    with ThreadPoolExecutor(max_workers=threads, thread_name_prefix="cloacal") as pool:
+        pending = deque()
+        for chunk in batched(items, chunk_size):
+            pending.append(pool.submit(work, chunk, option))
+            if len(pending) >= window:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def parse_batch(
+    texts: Iterable[str],
+    threads: int | None = None,
+    chunk_size: int = 64,
+    window: int | None = None,
+) -> Iterator[dict]:
+    """
+    Parses many clo texts on a pool of threads and yields an OrderedDict for
+    each, in input order.
+
+    Args:
+        texts: Iterable of clo texts, one sheet each.
+        threads (int | None): Number of worker threads (default: the number of
+            CPUs). 1 parses in the calling thread.
+        chunk_size (int): Number of texts handed to a thread at a time.
+        window (int | None): Maximum number of chunks in flight (default:
+            twice the number of threads).
+    """
+    return _run(_parse_chunk, texts, None, threads, chunk_size, window)
+
+
+def format_batch(
+    items: Iterable[str | Mapping],
+    threads: int | None = None,
+    max_line_length: int = 44,
+    chunk_size: int = 64,
+    window: int | None = None,
+) -> Iterator[str]:
+    """
+    Formats many sheets on a pool of threads and yields the formatted strings
+    in input order. Items may be parsed sheets, formatted like `format_dict`
+    does, or clo texts, formatted like `format_str` does.
+
+    Args:
+        items: Iterable of parsed sheets or clo texts.
+        threads (int | None): Number of worker threads (default: the number of
+            CPUs). 1 formats in the calling thread.
+        max_line_length (int): Maximum length for wrapped lines (default: 44).
+        chunk_size (int): Number of items handed to a thread at a time.
+        window (int | None): Maximum number of chunks in flight (default:
+            twice the number of threads).
+    """
+    return _run(_format_chunk, items, max_line_length, threads, chunk_size, window)
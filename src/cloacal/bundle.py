@@ -0,0 +1,254 @@
+"""
+Reads and writes sheets inside tar and zip bundles without extracting them.
+
+Tar bundles are read as a stream, in one sequential pass, whatever their
+compression. Members are handed out one at a time, and a rewritten bundle
+gets every member as soon as it has been read and converted, so a bundle is
+never unpacked to disk or held in memory as a whole.
+"""
+
+import os
+import stat
+import time
+from collections import namedtuple
+from collections.abc import Callable, Iterator
+from pathlib import PurePath
+
+from .git import path_matches
+
+# tarfile write modes by bundle suffix
+TAR_SUFFIXES = {
+    ".tar": "w",
+    ".tar.gz": "w:gz",
+    ".tgz": "w:gz",
+    ".tar.bz2": "w:bz2",
+    ".tbz2": "w:bz2",
+    ".tar.xz": "w:xz",
+    ".txz": "w:xz",
+}
+
+# info is the TarInfo or ZipInfo the member was read with, which a rewritten
+# bundle copies the mode, owner and file type of
+Member = namedtuple("Member", ["name", "data", "mtime", "info"], defaults=[None])
+
+
+class BundleError(ValueError):
+    """The file is not a tar or zip bundle, or cannot be read as one."""
+
+
+def bundle_kind(path: str) -> str | None:
+    """Returns "tar" or "zip" for a path with a bundle suffix, or None."""
+    name = os.fspath(path).lower()
+    if name.endswith(".zip"):
+        return "zip"
+    if name.endswith(tuple(TAR_SUFFIXES)):
+        return "tar"
+    return None
+
+
+def _tar_mode(path):
+    name = os.fspath(path).lower()
+    return next(mode for suffix, mode in TAR_SUFFIXES.items() if name.endswith(suffix))
+
+
+def _zip_mode(info):
+    # zip keeps the Unix mode, file type included, in the high external bits
+    mode = info.external_attr >> 16
+    if info.is_dir():
+        return stat.S_IFDIR | (stat.S_IMODE(mode) or 0o755)
+    if stat.S_ISLNK(mode):
+        return mode
+    return stat.S_IFREG | (stat.S_IMODE(mode) or 0o644)
+
+
+def _is_file(info):
+    if info is None:
+        return True
+    if hasattr(info, "isfile"):
+        return info.isfile()
+    return stat.S_ISREG(_zip_mode(info))
+
+
+def _iter_entries(path):
+    # every member, directories and links included; links carry no data in
+    # tar bundles and their target in zip bundles
+    import tarfile
+    import zipfile
+
+    try:
+        if bundle_kind(path) == "zip":
+            with zipfile.ZipFile(path) as bundle:
+                for info in bundle.infolist():
+                    mtime = time.mktime(info.date_time + (0, 0, -1))
+                    yield Member(info.filename, bundle.read(info), mtime, info)
+        else:
+            # "r|*" reads the members front to back, without seeking
+            with tarfile.open(path, "r|*") as bundle:
+                for info in bundle:
+                    data = bundle.extractfile(info).read() if info.isfile() else b""
+                    yield Member(info.name, data, info.mtime, info)
+    except (tarfile.TarError, zipfile.BadZipFile, EOFError) as e:
+        raise BundleError(f"{path}: {e}") from e
+
+
+def iter_members(path: str) -> Iterator[Member]:
+    """
+    Yields every regular file in a bundle, in the order it is stored.
+
+    Raises:
+        BundleError: If the file is not a valid tar or zip bundle.
+    """
+    for member in _iter_entries(path):
+        if _is_file(member.info):
+            yield member
+
+
+def read_bundle(path: str, members: str = "*.clo") -> Iterator[tuple[str, str]]:
+    """
+    Yields (name, text) for the members of a bundle matching `members`.
+    "*.clo" matches .clo files in any directory, "npcs/*.clo" those in npcs/
+    and "npcs/**/*.clo" those anywhere below it.
+    """
+    for member in iter_members(path):
+        if path_matches(member.name, members):
+            yield member.name, member.data.decode()
+
+
+def _tar_info(member):
+    import copy
+    import tarfile
+
+    if isinstance(member.info, tarfile.TarInfo):
+        info = copy.copy(member.info)
+    else:
+        info = tarfile.TarInfo()
+        info.mtime = member.mtime
+        mode = _zip_mode(member.info) if member.info else stat.S_IFREG | 0o644
+        info.mode = stat.S_IMODE(mode)
+        if stat.S_ISDIR(mode):
+            info.type = tarfile.DIRTYPE
+        elif stat.S_ISLNK(mode):
+            info.type, info.linkname = tarfile.SYMTYPE, member.data.decode()
+    info.name = member.name.rstrip("/")
+    if info.isfile():
+        info.size = len(member.data)
+        return info, member.data
+    return info, None
+
+
+def _zip_info(member):
+    import copy
+    import tarfile
+    import zipfile
+
+    if isinstance(member.info, zipfile.ZipInfo):
+        info = copy.copy(member.info)
+        info.filename = member.name
+        return info, member.data
+
+    date_time = time.localtime(max(member.mtime, 315532800))[:6]
+    data, mode = member.data, stat.S_IFREG | 0o644
+    if isinstance(member.info, tarfile.TarInfo):
+        tar = member.info
+        if tar.isdir():
+            mode = stat.S_IFDIR | tar.mode
+        elif tar.issym():
+            data, mode = tar.linkname.encode(), stat.S_IFLNK | tar.mode
+        elif tar.isfile():
+            mode = stat.S_IFREG | tar.mode
+        else:
+            raise BundleError(f"{member.name}: zip bundles cannot hold this member")
+    name = member.name.rstrip("/") + "/" if stat.S_ISDIR(mode) else member.name
+    info = zipfile.ZipInfo(name, date_time)
+    info.compress_type = zipfile.ZIP_DEFLATED
+    # the MS-DOS directory flag marks directories for other zip tools
+    info.external_attr = mode << 16 | (0x10 if stat.S_ISDIR(mode) else 0)
+    return info, data
+
+
+class _Writer:
+    def __init__(self, path):
+        import tarfile
+        import zipfile
+
+        if bundle_kind(path) == "zip":
+            self._bundle = zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED)
+        elif bundle_kind(path) == "tar":
+            # closed by close(), once the last member is written
+            self._bundle = tarfile.open(path, _tar_mode(path))  # noqa: SIM115
+        else:
+            raise BundleError(f"{path} does not end in .zip, .tar or .tar.gz...")
+
+    def add(self, member):
+        import io
+        import zipfile
+
+        if isinstance(self._bundle, zipfile.ZipFile):
+            self._bundle.writestr(*_zip_info(member))
+        else:
+            info, data = _tar_info(member)
+            self._bundle.addfile(info, None if data is None else io.BytesIO(data))
+
+    def close(self):
+        self._bundle.close()
+
+
+def rewrite_bundle(
+    path: str,
+    output: str,
+    convert: Callable[[str, str], tuple[str, str]],
+    members: str = "*.clo",
+    keep: bool = False,
+) -> int:
+    """
+    Writes a new bundle to `output` in one pass over the bundle at `path`,
+    with every file matching `members` converted, and returns how many
+    members were converted. Other members, directories and links included,
+    are copied as they are, and converted members keep the mode and owner of
+    the member they came from. `output` may be `path` itself, which is then
+    replaced once the new bundle is complete.
+
+    Args:
+        path (str): The bundle to read.
+        output (str): The bundle to write; its suffix picks tar or zip and
+            the compression.
+        convert: Takes the name and text of a member and returns the name
+            and text of the converted member.
+        members (str): Pattern of the members to convert, as in `read_bundle`
+            (default: "*.clo").
+        keep (bool): Also keep the members that were converted.
+
+    Raises:
+        BundleError: If a bundle cannot be read, `output` has no bundle
+            suffix, or a converted member would get the name of a member
+            that is kept.
+    """
+    temporary = f"{output}.tmp{os.getpid()}{''.join(PurePath(output).suffixes)}"
+    count = 0
+    # names of the members copied and converted, so that a converted member
+    # never lands next to a copied one of the same name
+    copied, converted = set(), set()
+    writer = _Writer(temporary)
+    try:
+        for member in _iter_entries(path):
+            convertible = _is_file(member.info) and path_matches(member.name, members)
+            if keep or not convertible:
+                if member.name in converted:
+                    raise BundleError(f"{path} already holds {member.name}")
+                copied.add(member.name)
+                writer.add(member)
+            if not convertible:
+                continue
+            name, text = convert(member.name, member.data.decode())
+            if name in copied:
+                raise BundleError(f"{path} already holds {name}")
+            converted.add(name)
+            writer.add(Member(name, text.encode(), member.mtime, member.info))
+            count += 1
+        writer.close()
+    except BaseException:
+        writer.close()
+        os.remove(temporary)
+        raise
+    os.replace(temporary, output)
+    return count
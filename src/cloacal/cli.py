@@ -1,12 +1,12 @@
 import glob
 import os
 import sys
-from pathlib import Path
 
 import click
 
-from .format import format_str
-from .toml2clo import toml2clo
+from .format import Formatter
+from .parse import parse_lines
+from .source import open_lines
 
 
 @click.group()
@@ -15,19 +15,45 @@ def cli():
     ...
 
 
+def parse_line_range(ctx, param, value):
+    """
+    Turns a 1-based, inclusive START:END option into a (start, end) line
+    range for `format_range`. A single line number selects that line.
+    """
+    if value is None:
+        return None
+    start, _, end = value.partition(":")
+    try:
+        start, end = int(start), int(end or start)
+    except ValueError:
+        raise click.BadParameter("expected START:END, for example 10:24")
+    if not 1 <= start <= end:
+        raise click.BadParameter("lines are numbered from 1 and START <= END")
+    return start - 1, end
+
+
+def parse_widths(ctx, param, value):
+    """Turns a --width option such as 44 or 44,72,100 into a list of widths."""
+    try:
+        return [int(width) for width in str(value).split(",")]
+    except ValueError:
+        raise click.BadParameter("expected widths such as 44 or 44,72,100")
+
+
 @cli.command()
 @click.option(
     "-f",
     "--file",
-    type=str | list[str],
+    type=str,
     default=None,
     help="Input .clo file or glob pattern (reads from stdin if not provided)",
 )
 @click.option(
     "--width",
-    default=44,
-    type=int,
-    help="Maximum line width (default: 44)",
+    "widths",
+    default="44",
+    callback=parse_widths,
+    help="Maximum line width, or comma-separated widths (default: 44)",
 )
 @click.option(
     "-o",
@@ -38,9 +64,105 @@ def cli():
     is_flag=False,
     flag_value="",
 )
-def format(file, width, output):
+@click.option(
+    "--daemon",
+    is_flag=True,
+    help="Format with a running `cloacal serve` (falls back to in-process)",
+)
+@click.option(
+    "--lines",
+    "line_range",
+    default=None,
+    callback=parse_line_range,
+    metavar="START:END",
+    help="Only format the entries overlapping these lines (1-based, inclusive)",
+)
+@click.option(
+    "--changed-since",
+    metavar="REF",
+    default=None,
+    help="Only format files changed since a git commit, branch or tag",
+)
+@click.option(
+    "--staged",
+    is_flag=True,
+    help="Only format files staged in git",
+)
+@click.option(
+    "--members",
+    default="*.clo",
+    help='Members to format in tar and zip bundles (default: "*.clo")',
+)
+def format(file, widths, output, daemon, line_range, changed_since, staged, members):
     """Format a .clo file."""
+    if len(widths) > 1 and line_range:
+        raise click.UsageError("--lines works with a single --width")
+    if len(widths) > 1 and daemon:
+        raise click.UsageError("--daemon works with a single --width")
+    width = widths[0]
+    formatter = Formatter(max_line_length=width)
+    stdout = click.get_text_stream("stdout")
+
+    def write_widths(data, path, label=None):
+        # every width goes to its own file, or after a header on stdout
+        from .format import format_widths
+
+        for size, text in format_widths(data, widths).items():
+            if path is None:
+                click.echo(f"==> {label or 'stdin'} (width {size}) <==")
+                stdout.write(text + "\n")
+            else:
+                base, ext = os.path.splitext(path)
+                with open(f"{base}.{size}{ext}", "w") as f:
+                    f.write(text)
+
+    def reformat(text):
+        # everything outside the reformatted entries is kept as it is
+        from .format import apply_edits, format_range
+
+        edits = format_range(text, *line_range, max_line_length=width)
+        return apply_edits(text, edits)
+
+    def read(lines):
+        # the daemon hands back finished text; without one, parse here
+        if daemon:
+            formatted = format_with_daemon("\n".join(lines), width)
+            if formatted is not None:
+                return formatted
+        return parse_lines(lines)
+
+    def write(sheet, out):
+        if isinstance(sheet, str):
+            out.write(sheet)
+        else:
+            formatter.write(sheet, out)
+
+    def format_member(name, text):
+        import io
+
+        out = io.StringIO()
+        write(read(text.strip("\n").split("\n")), out)
+        return name, out.getvalue()
+
+    if changed_since is not None or staged:
+        # ask git instead of globbing the whole tree; -f narrows the files
+        from .git import GitError, changed_files
+
+        try:
+            input_files = changed_files(
+                since=changed_since, staged=staged, pattern=file or "*.clo"
+            )
+        except GitError as e:
+            raise click.ClickException(str(e))
+        if not input_files:
+            click.echo("No changed files to format", err=True)
+            return
+        file = input_files
+
     if file:
+        from .bundle import BundleError, bundle_kind, read_bundle, rewrite_bundle
+        from .pack import Archive, ArchiveError, format_archive, is_archive
+
         # Handle glob pattern or list of files
         if isinstance(file, str):
             input_files = glob.glob(file)
@@ -52,34 +174,90 @@ def format(file, width, output):
             sys.exit(1)
 
         for input_file in input_files:
-            with open(input_file, "r") as f:
-                input_text = f.read()
+            if output is None:
+                output_path = None
+            elif output:
+                # If specific output path and multiple files, append numbers
+                if len(input_files) > 1:
+                    base, ext = os.path.splitext(output)
+                    output_path = f"{base}_{input_files.index(input_file) + 1}{ext}"
+                else:
+                    output_path = output
+            else:
+                output_path = input_file
+
+            if bundle_kind(input_file):
+                # members are streamed out of the bundle, into a new bundle
+                # or to stdout
+                if len(widths) > 1 or line_range:
+                    raise click.UsageError(
+                        "bundles are formatted at a single --width, without --lines"
+                    )
+                try:
+                    if output_path is None:
+                        for name, text in read_bundle(input_file, members):
+                            click.echo(f"==> {input_file}:{name} <==")
+                            stdout.write(format_member(name, text)[1] + "\n")
+                    else:
+                        rewrite_bundle(input_file, output_path, format_member, members)
+                except BundleError as e:
+                    raise click.ClickException(str(e))
+                continue
 
-            formatted_output = format_str(input_text, max_line_length=width)
+            if is_archive(input_file):
+                # every sheet is formatted into a new archive, which replaces
+                # the old one when formatting in place
+                if len(widths) > 1 or line_range or daemon:
+                    raise click.UsageError(
+                        "archives are formatted at a single --width, "
+                        "without --lines or --daemon"
+                    )
+                try:
+                    if output_path is None:
+                        with Archive(input_file) as archive:
+                            sheets = (
+                                parse_lines(text.split("\n")) for _, text in archive
+                            )
+                            formatter.format_many(sheets, out=stdout)
+                    else:
+                        format_archive(input_file, output_path, width=width)
+                except ArchiveError as e:
+                    raise click.ClickException(str(e))
+                continue
 
-            if output is None:
+            if len(widths) > 1:
+                with open_lines(input_file) as lines:
+                    write_widths(parse_lines(lines), output_path, input_file)
+                continue
+
+            if line_range:
+                with open(input_file) as f:
+                    sheet = reformat(f.read())
+            else:
+                with open_lines(input_file) as lines:
+                    sheet = read(lines)
+
+            if output_path is None:
                 # Print with file header if multiple files
                 if len(input_files) > 1:
                     click.echo(f"==> {input_file} <==")
-                click.echo(formatted_output)
+                write(sheet, stdout)
+                if not (line_range and sheet.endswith("\n")):
+                    stdout.write("\n")
             else:
-                if output:
-                    # If specific output path and multiple files, append numbers
-                    if len(input_files) > 1:
-                        base, ext = os.path.splitext(output)
-                        output_path = f"{base}_{input_files.index(input_file) + 1}{ext}"
-                    else:
-                        output_path = output
-                else:
-                    output_path = input_file
-
                 with open(output_path, "w") as f:
-                    f.write(formatted_output)
+                    write(sheet, f)
+
+    elif not sys.stdin.isatty() and line_range:
+        stdout.write(reformat(sys.stdin.read()))
+
+    elif not sys.stdin.isatty() and len(widths) > 1:
+        lines = sys.stdin.read().strip("\n").split("\n")
+        write_widths(parse_lines(lines), output or None)
 
     elif not sys.stdin.isatty():
-        input_text = sys.stdin.read()
-        formatted_output = format_str(input_text, max_line_length=width)
-        click.echo(formatted_output)
+        write(read(sys.stdin.read().strip("\n").split("\n")), stdout)
+        stdout.write("\n")
 
     else:
         click.echo(cli.get_help(click.Context(cli)))
@@ -109,8 +287,32 @@ def format(file, width, output):
     is_flag=False,
     flag_value="",
 )
-def toml(file, width, output):
+@click.option(
+    "--chunked",
+    is_flag=True,
+    help="Convert one top-level table at a time, writing every table as a sheet",
+)
+@click.option(
+    "--members",
+    default="*.toml",
+    help='Members to convert in tar and zip bundles (default: "*.toml")',
+)
+def toml(file, width, output, chunked, members):
     """Convert TOML to Cloacal format."""
+    # imported here so that the other commands don't pay for tomllib
+    from contextlib import ExitStack
+    from pathlib import Path, PurePosixPath
+
+    from .bundle import BundleError, bundle_kind, read_bundle, rewrite_bundle
+    from .toml2clo import iter_toml2clo, toml2clo
+
+    def convert(name, text):
+        # member names always use forward slashes
+        name = str(PurePosixPath(name).with_suffix(".clo"))
+        if chunked:
+            sheets = iter_toml2clo(text.splitlines(keepends=True), width)
+            return name, "\n".join(f"{sheet}\n" for sheet in sheets)
+        return name, toml2clo(text, width)
 
     input_files = glob.glob(file)
     if not input_files:
@@ -118,33 +320,245 @@ def toml(file, width, output):
         sys.exit(1)
 
     for input_file in input_files:
+        if output is None:
+            output_path = None
+        elif output:
+            # If specific output path and multiple files, append numbers
+            if len(input_files) > 1:
+                base, ext = os.path.splitext(output)
+                output_path = f"{base}_{input_files.index(input_file) + 1}{ext}"
+            else:
+                output_path = output
+        else:
+            # Replace .toml extension with .clo
+            input_path = Path(input_file)
+            output_path = input_path.with_suffix(".clo")
+
+        if bundle_kind(input_file):
+            # the sheets go into a new bundle, or next to the TOML members
+            # when converting in place
+            try:
+                if output_path is None:
+                    for name, text in read_bundle(input_file, members):
+                        name, sheet = convert(name, text)
+                        click.echo(f"==> {input_file}:{name} <==")
+                        click.echo(sheet.rstrip("\n"))
+                else:
+                    target = output_path if output else input_file
+                    rewrite_bundle(
+                        input_file, target, convert, members, keep=not output
+                    )
+            except BundleError as e:
+                raise click.ClickException(str(e))
+            continue
+
+        # Print with file header if multiple files
+        if output_path is None and len(input_files) > 1:
+            click.echo(f"==> {input_file} <==")
+
+        if chunked:
+            # every table is written as soon as it has been read, as one
+            # sheet after another
+            with ExitStack() as stack:
+                if output_path:
+                    out = stack.enter_context(open(output_path, "w"))
+                else:
+                    out = click.get_text_stream("stdout")
+                f = stack.enter_context(open(input_file, "r"))
+                for i, sheet in enumerate(iter_toml2clo(f, width)):
+                    out.write(f"\n{sheet}\n" if i else f"{sheet}\n")
+            continue
+
         with open(input_file, "r") as f:
             toml_input = f.read()
 
         formatted_output = toml2clo(toml_input, max_line_length=width)
 
-        if output is None:
-            # Print with file header if multiple files
-            if len(input_files) > 1:
-                click.echo(f"==> {input_file} <==")
+        if output_path is None:
             click.echo(formatted_output)
         else:
-            if output:
-                # If specific output path and multiple files, append numbers
-                if len(input_files) > 1:
-                    base, ext = os.path.splitext(output)
-                    output_path = f"{base}_{input_files.index(input_file) + 1}{ext}"
-                else:
-                    output_path = output
-            else:
-                # Replace .toml extension with .clo
-                input_path = Path(input_file)
-                output_path = input_path.with_suffix(".clo")
-
             with open(output_path, "w") as f:
                 f.write(formatted_output)
 
 
+@cli.command()
+@click.option(
+    "-f",
+    "--file",
+    type=str,
+    multiple=True,
+    help="Input .clo files or glob patterns (reads from stdin if not provided)",
+)
+@click.option(
+    "--to",
+    "to",
+    type=click.Choice(["jsonl", "toml"]),
+    default="jsonl",
+    help="Output format (default: jsonl)",
+)
+@click.option(
+    "-j",
+    "--jobs",
+    default=1,
+    type=int,
+    help="Number of processes parsing sheets (default: 1)",
+)
+@click.option(
+    "-o",
+    "--output",
+    type=click.Path(),
+    default=None,
+    help="Output file path (prints to stdout if not provided)",
+)
+def export(file, to, jobs, output):
+    """Export every sheet as JSON Lines or TOML."""
+    from contextlib import ExitStack
+
+    from .export import export, parse_ordered, write_jsonl, write_toml
+    from .parse import split_sheets
+
+    for pattern in file:
+        if not glob.glob(pattern) and not os.path.exists(pattern):
+            raise click.BadParameter(
+                f"No files found matching pattern: {pattern}", param_hint="'-f'"
+            )
+
+    with ExitStack() as stack:
+        if output:
+            out = stack.enter_context(open(output, "w"))
+        else:
+            out = click.get_text_stream("stdout")
+        if file:
+            export(file, out, to=to, jobs=jobs)
+        elif not sys.stdin.isatty():
+            lines = sys.stdin.read().split("\n")
+            sheets = parse_ordered(split_sheets(lines), jobs=jobs)
+            (write_jsonl if to == "jsonl" else write_toml)(sheets, out)
+        else:
+            click.echo(cli.get_help(click.Context(cli)))
+            sys.exit(1)
+
+
+@cli.command()
+@click.option(
+    "-f",
+    "--file",
+    type=str,
+    multiple=True,
+    required=True,
+    help="Input .clo files or glob patterns",
+)
+@click.option(
+    "-o",
+    "--output",
+    type=click.Path(),
+    required=True,
+    help="Archive to write",
+)
+@click.option(
+    "--compress",
+    is_flag=True,
+    help="Compress every sheet with zlib",
+)
+@click.option(
+    "--width",
+    default=44,
+    type=int,
+    help="Maximum line width (default: 44)",
+)
+def pack(file, output, compress, width):
+    """Pack formatted sheets into one archive."""
+    from .pack import pack as pack_archive
+
+    input_files = [path for pattern in file for path in sorted(glob.glob(pattern))]
+    if not input_files:
+        click.echo(f"No files found matching pattern: {' '.join(file)}", err=True)
+        sys.exit(1)
+    count = pack_archive(input_files, output, compress=compress, width=width)
+    click.echo(f"packed {count} sheets from {len(input_files)} files", err=True)
+
+
+@cli.command()
+@click.option(
+    "-f",
+    "--file",
+    type=click.Path(exists=True, dir_okay=False),
+    required=True,
+    help="Archive to unpack",
+)
+@click.option(
+    "-o",
+    "--output",
+    type=click.Path(file_okay=False),
+    default=".",
+    help="Directory to unpack into (default: the current one)",
+)
+@click.option(
+    "--name",
+    default=None,
+    help="Only print the sheet of this character",
+)
+def unpack(file, output, name):
+    """Unpack an archive back into .clo files."""
+    from .pack import Archive, ArchiveError
+    from .pack import unpack as unpack_archive
+
+    try:
+        if name is None:
+            paths = unpack_archive(file, output)
+            click.echo(f"unpacked {len(paths)} files", err=True)
+            return
+        with Archive(file) as archive:
+            entry = archive.find(name)
+            if entry is None:
+                click.echo(f"No sheet named {name!r} in {file}", err=True)
+                sys.exit(1)
+            click.echo(archive.read(entry))
+    except ArchiveError as e:
+        raise click.ClickException(str(e))
+
+
+@cli.command()
+@click.option(
+    "--socket",
+    "socket_path",
+    type=click.Path(),
+    default=None,
+    help="Unix socket to listen on (default: $CLOACAL_SOCKET or a per-user path)",
+)
+@click.option(
+    "--workers",
+    default=4,
+    type=int,
+    help="Number of requests answered at the same time (default: 4)",
+)
+def serve(socket_path, workers):
+    """Keep a formatter running for editor integrations."""
+    import signal
+
+    from .daemon import default_socket_path
+    from .daemon import serve as run_daemon
+
+    # exit cleanly on SIGTERM too, so that the socket file is removed
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    socket_path = socket_path or default_socket_path()
+    click.echo(f"cloacal listening on {socket_path}", err=True)
+    run_daemon(socket_path, workers=workers)
+
+
+def format_with_daemon(text, width):
+    """
+    Formats text with a running `cloacal serve`, or returns None when no
+    daemon is listening or it fails to answer.
+    """
+    from .daemon import DaemonError, request
+
+    try:
+        return request("format", text=text, width=width)
+    except (OSError, DaemonError, ValueError):
+        return None
+
+
 def main():
     cli()
 
@@ -0,0 +1,330 @@
+"""
+A columnar view of many parsed sheets for corpus-wide queries.
+
+`Columns.from_sheets` turns the simple pairs of every sheet (plus the name)
+into one column per key. Columns whose values are all numbers become
+`NumericColumn`s backed by `array` arrays; the others become
+`CategoricalColumn`s, where each distinct string is stored once and rows
+hold small integer codes.
+
+Queries work on whole columns at once. Filters return a `Mask` with one byte
+per row, built with C-level primitives (bytes.translate, map over operator
+functions, big-integer bitwise operations) rather than a Python loop over
+sheets, and counts and group-bys use itertools.compress and Counter over
+the arrays.
+"""
+
+import math
+import operator
+from array import array
+from collections import Counter
+from collections.abc import Iterable, Mapping
+from itertools import compress, repeat
+
+from .format import is_simple_pair
+
+OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+AGGREGATES = ("count", "sum", "mean", "min", "max")
+
+
+class Mask:
+    """
+    A row selection: one byte per row, 1 for selected rows and 0 otherwise.
+    Masks combine with `&`, `|` and `~`.
+    """
+
+    __slots__ = ("bits",)
+
+    def __init__(self, bits: bytes):
+        self.bits = bytes(bits)
+
+    def __len__(self) -> int:
+        return len(self.bits)
+
+    def _combine(self, other, op):
+        n = len(self.bits)
+        value = op(int.from_bytes(self.bits), int.from_bytes(other.bits))
+        return Mask(value.to_bytes(n))
+
+    def __and__(self, other):
+        return self._combine(other, operator.and_)
+
+    def __or__(self, other):
+        return self._combine(other, operator.or_)
+
+    def __invert__(self):
+        return self._combine(Mask(b"\x01" * len(self.bits)), operator.xor)
+
+    def count(self) -> int:
+        """Returns the number of selected rows."""
+        return self.bits.count(1)
+
+    def rows(self) -> list[int]:
+        """Returns the indices of the selected rows."""
+        return list(compress(range(len(self.bits)), self.bits))
+
+
+def _parse_number(text):
+    try:
+        return int(text)
+    except ValueError:
+        number = float(text)
+    # "nan" and "inf" are words in a text column, not numbers
+    if not math.isfinite(number):
+        raise ValueError(f"not a finite number: {text!r}")
+    return number
+
+
+class NumericColumn:
+    """
+    A column of numbers. `values` is an array of int64 ("q") or float64 ("d")
+    with 0 in missing rows, and `present` has a 1 byte for every row that
+    has a value.
+    """
+
+    __slots__ = ("present", "values")
+
+    def __init__(self, values: array, present: bytes):
+        self.values = values
+        self.present = present
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __getitem__(self, row: int):
+        return self.values[row] if self.present[row] else None
+
+    def compare(self, op: str, value) -> Mask:
+        """Returns the rows whose value compares to `value` with `op`."""
+        if isinstance(value, str):
+            value = _parse_number(value)
+        matches = bytes(map(OPERATORS[op], self.values, repeat(value)))
+        return Mask(matches) & Mask(self.present)
+
+    def selected(self, mask: Mask | None = None) -> list:
+        """Returns the values of the selected rows that have a value."""
+        present = Mask(self.present) if mask is None else mask & Mask(self.present)
+        return list(compress(self.values, present.bits))
+
+
+class CategoricalColumn:
+    """
+    A dictionary-encoded column of strings. `categories[code - 1]` is the
+    value of a row with that code, and code 0 marks a missing value.
+    """
+
+    __slots__ = ("categories", "codes")
+
+    def __init__(self, categories: list[str], codes: array):
+        self.categories = categories
+        self.codes = codes
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, row: int):
+        code = self.codes[row]
+        return self.categories[code - 1] if code else None
+
+    @property
+    def present(self) -> bytes:
+        return self._select_codes(range(1, len(self.categories) + 1))
+
+    def _select_codes(self, codes) -> bytes:
+        codes = set(codes)
+        if self.codes.typecode == "B":
+            table = bytes(code in codes for code in range(256))
+            return self.codes.tobytes().translate(table)
+        return bytes(map(codes.__contains__, self.codes))
+
+    def compare(self, op: str, value) -> Mask:
+        """
+        Returns the rows whose value compares to `value` with `op`. The
+        comparison runs once per category, not once per row.
+        """
+        compare = OPERATORS[op]
+        matching = [
+            code
+            for code, category in enumerate(self.categories, start=1)
+            if compare(category, value)
+        ]
+        return Mask(self._select_codes(matching))
+
+
+def _build_column(cells):
+    present = [cell for cell in cells if cell is not None]
+    try:
+        numbers = [_parse_number(cell) for cell in present]
+    except ValueError:
+        numbers = None
+    if numbers is not None and present:
+        typecode = "q" if all(isinstance(n, int) for n in numbers) else "d"
+        numbers = iter(numbers)
+        try:
+            values = array(
+                typecode, [0 if cell is None else next(numbers) for cell in cells]
+            )
+        except OverflowError:
+            pass
+        else:
+            return NumericColumn(values, bytes(cell is not None for cell in cells))
+
+    categories = {}
+    codes = [
+        0 if cell is None else categories.setdefault(cell, len(categories) + 1)
+        for cell in cells
+    ]
+    typecode = "B" if len(categories) < 256 else "l"
+    return CategoricalColumn(list(categories), array(typecode, codes))
+
+
+class Columns:
+    """
+    Column-oriented storage for the simple pairs of many sheets. Row `i` is
+    the `i`-th sheet given to `from_sheets`.
+    """
+
+    def __init__(self, columns: dict, rows: int):
+        self.columns = columns
+        self.rows = rows
+
+    @classmethod
+    def from_sheets(cls, sheets: Iterable[Mapping]) -> "Columns":
+        """
+        Builds columns from parsed sheets (OrderedDicts or `Corpus` sheets).
+        Every key holding a simple pair in at least one sheet gets a column;
+        rows where the key is missing or holds a block have no value.
+        """
+        cells: dict[str, list] = {}
+        rows = 0
+        for data in sheets:
+            for key, value in data.items():
+                if key == "name" or is_simple_pair(key, value):
+                    column = cells.get(key)
+                    if column is None:
+                        column = cells[key] = [None] * rows
+                    column.append(value)
+            rows += 1
+            for column in cells.values():
+                if len(column) < rows:
+                    column.append(None)
+        return cls({key: _build_column(c) for key, c in cells.items()}, rows)
+
+    def __getitem__(self, key: str):
+        return self.columns[key]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.columns
+
+    def keys(self):
+        return self.columns.keys()
+
+    def all(self) -> Mask:
+        """Returns a mask selecting every row."""
+        return Mask(b"\x01" * self.rows)
+
+    def where(self, key: str, op: str, value) -> Mask:
+        """
+        Returns the rows where column `key` compares to `value` with `op`,
+        one of ==, !=, <, <=, > or >=. Rows without a value never match.
+
+        Example: columns.where("age", ">=", 30) & columns.where("ilk", "==", "bird")
+        """
+        if key not in self.columns:
+            return Mask(bytes(self.rows))
+        return self.columns[key].compare(op, value)
+
+    def count(self, key: str, where: Mask | None = None) -> dict:
+        """
+        Returns how many of the selected rows hold each value of column `key`,
+        most common first.
+        """
+        column = self.columns[key]
+        if isinstance(column, NumericColumn):
+            return dict(Counter(column.selected(where)).most_common())
+        codes = column.codes if where is None else compress(column.codes, where.bits)
+        counts = Counter(codes)
+        counts.pop(0, None)
+        return {column.categories[code - 1]: n for code, n in counts.most_common()}
+
+    def group_by(
+        self,
+        key: str,
+        of: str | None = None,
+        agg: str = "count",
+        where: Mask | None = None,
+    ) -> dict:
+        """
+        Groups the selected rows by the value of column `key` and aggregates
+        each group: "count" counts the rows, and "sum", "mean", "min" and
+        "max" aggregate the numeric column `of` over the rows that have a
+        value in it.
+
+        Example: columns.group_by("species", of="age", agg="mean")
+        """
+        if agg not in AGGREGATES:
+            raise ValueError(f"unknown aggregate: {agg!r}")
+        if agg == "count":
+            return self.count(key, where=where)
+        target = self.columns[of]
+        if not isinstance(target, NumericColumn):
+            raise TypeError(f"column {of!r} is not numeric")
+
+        aggregate = {
+            "sum": sum,
+            "mean": lambda values: sum(values) / len(values),
+            "min": min,
+            "max": max,
+        }[agg]
+        return {
+            value: aggregate(values)
+            for value, values in self._grouped_values(key, target, where).items()
+        }
+
+    def _grouped_values(self, key, target, where):
+        # one pass over the rows that have a value in both columns, in the
+        # order of the categories or of the numeric values
+        column = self.columns[key]
+        selected = Mask(target.present) & Mask(column.present)
+        if where is not None:
+            selected &= where
+        keys = column.codes if isinstance(column, CategoricalColumn) else column.values
+        grouped = {}
+        for group, value in compress(zip(keys, target.values), selected.bits):
+            values = grouped.get(group)
+            if values is None:
+                values = grouped[group] = []
+            values.append(value)
+        if isinstance(column, CategoricalColumn):
+            return {
+                column.categories[code - 1]: grouped[code] for code in sorted(grouped)
+            }
+        return {group: grouped[group] for group in sorted(grouped)}
+
+    def to_numpy(self, key: str):
+        """
+        Returns column `key` as a NumPy array: a masked int64 or float64
+        array for numeric columns, and an object array with None for missing
+        values otherwise. Needs NumPy to be installed.
+        """
+        try:
+            import numpy
+        except ImportError as e:
+            raise ImportError("to_numpy() needs numpy to be installed") from e
+
+        column = self.columns[key]
+        if isinstance(column, NumericColumn):
+            dtype = numpy.int64 if column.values.typecode == "q" else numpy.float64
+            values = numpy.frombuffer(column.values, dtype=dtype).copy()
+            missing = numpy.frombuffer(column.present, dtype=numpy.uint8) == 0
+            return numpy.ma.MaskedArray(values, mask=missing)
+        lookup = numpy.array([None, *column.categories], dtype=object)
+        return lookup[numpy.asarray(column.codes)]
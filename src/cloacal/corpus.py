@@ -0,0 +1,174 @@
+"""
+A compact in-memory store for large numbers of parsed sheets.
+
+Parsed sheets are OrderedDicts, each with its own hash table and its own
+copies of the key strings. A `Corpus` keeps sheets as `Sheet` objects
+instead: two slots pointing at a key layout shared by every sheet with the
+same keys in the same order, and a tuple of values. Keys and short
+simple-pair values (ages, species, ilks...) go through one intern table, so
+each distinct string is stored once for the whole corpus.
+"""
+
+import sys
+from collections import OrderedDict
+from collections.abc import Iterable, Iterator, Mapping
+
+from .format import is_simple_pair
+from .parse import parse_lines, split_sheets
+
+# simple-pair values up to this many characters are interned
+MAX_INTERNED_LENGTH = 64
+
+
+class _Layout:
+    """The keys of a sheet, in order, with the position of each."""
+
+    __slots__ = ("keys", "positions")
+
+    def __init__(self, keys: tuple[str, ...]):
+        self.keys = keys
+        self.positions = {key: i for i, key in enumerate(keys)}
+
+
+class Sheet(Mapping):
+    """
+    A read-only parsed sheet stored in a `Corpus`.
+
+    Works like the OrderedDict returned by `parse`, except that list blocks
+    are tuples. Use `to_dict` to get a regular OrderedDict back.
+    """
+
+    __slots__ = ("_layout", "_values")
+
+    def __init__(self, layout: _Layout, values: tuple):
+        self._layout = layout
+        self._values = values
+
+    def __getitem__(self, key):
+        return self._values[self._layout.positions[key]]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._layout.keys)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __repr__(self) -> str:
+        return f"Sheet({dict(self)!r})"
+
+    def to_dict(self) -> OrderedDict:
+        """Returns the sheet as an OrderedDict, the way `parse` would."""
+        return OrderedDict(
+            (key, list(value) if isinstance(value, tuple) else value)
+            for key, value in zip(self._layout.keys, self._values)
+        )
+
+
+class Corpus:
+    """
+    Holds many parsed sheets in a compact, shared representation.
+
+    Args:
+        max_interned_length (int): Longest simple-pair value that is interned
+            (default: MAX_INTERNED_LENGTH).
+    """
+
+    def __init__(self, max_interned_length: int = MAX_INTERNED_LENGTH):
+        self.max_interned_length = max_interned_length
+        self._strings: dict[str, str] = {}
+        self._layouts: dict[tuple[str, ...], _Layout] = {}
+        self._sheets: list[Sheet] = []
+
+    def _intern(self, text: str) -> str:
+        return self._strings.setdefault(text, text)
+
+    def add(self, data: Mapping) -> Sheet:
+        """
+        Adds a parsed sheet to the corpus and returns its compact version.
+        """
+        keys = tuple(self._intern(key) for key in data)
+        layout = self._layouts.get(keys)
+        if layout is None:
+            layout = self._layouts[keys] = _Layout(keys)
+
+        values = []
+        for key, value in data.items():
+            if isinstance(value, list | tuple):
+                value = tuple(value)
+            elif is_simple_pair(key, value) and len(value) <= self.max_interned_length:
+                value = self._intern(value)
+            values.append(value)
+
+        sheet = Sheet(layout, tuple(values))
+        self._sheets.append(sheet)
+        return sheet
+
+    def load(self, path: str) -> int:
+        """
+        Adds every sheet in a clo file and returns how many there were.
+        """
+        from .source import open_lines
+
+        count = len(self._sheets)
+        with open_lines(path) as lines:
+            for sheet_lines in split_sheets(lines):
+                self.add(parse_lines(sheet_lines))
+        return len(self._sheets) - count
+
+    def __len__(self) -> int:
+        return len(self._sheets)
+
+    def __iter__(self) -> Iterator[Sheet]:
+        return iter(self._sheets)
+
+    def __getitem__(self, index: int) -> Sheet:
+        return self._sheets[index]
+
+    def memory_usage(self) -> int:
+        """
+        Returns the number of bytes used by the corpus, counting every shared
+        string, layout and the containers themselves once.
+        """
+        return deep_sizeof([self._sheets, self._strings, self._layouts])
+
+    def memory_per_sheet(self) -> float:
+        """Returns the average number of bytes used per sheet."""
+        return self.memory_usage() / len(self) if self._sheets else 0.0
+
+
+def deep_sizeof(objects: Iterable) -> int:
+    """
+    Returns the number of bytes used by the given objects and everything they
+    hold, counting shared objects once. Understands the containers sheets are
+    made of, so that a list of OrderedDicts from `parse` can be measured the
+    same way as a `Corpus`.
+    """
+    seen = set()
+    total = 0
+    stack = list(objects)
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, list | tuple):
+            stack.extend(obj)
+        elif isinstance(obj, Sheet):
+            stack.extend((obj._layout, obj._values))
+        elif isinstance(obj, _Layout):
+            stack.extend((obj.keys, obj.positions))
+    return total
+
+
+def load_corpus(paths: Iterable[str]) -> Corpus:
+    """
+    Loads every sheet in the given clo files into a new `Corpus`.
+    """
+    corpus = Corpus()
+    for path in paths:
+        corpus.load(path)
+    return corpus
@@ -0,0 +1,280 @@
+"""
+A long-running formatter process for editor integrations.
+
+`serve` listens on a local Unix socket. Clients send one JSON request per
+line and get one JSON response per line back on the same connection:
+
+    {"id": 1, "method": "format", "params": {"text": "...", "width": 44}}
+    {"id": 1, "result": "..."}
+
+Failed requests are answered with {"id": ..., "error": "message"}. The
+methods are:
+
+    format        the formatted text
+    format_range  the edits formatting lines [start, end) of the text makes,
+                  as [start_line, end_line, new_text] lists
+    check         whether the text is already formatted
+    parse         the parsed sheet, as a JSON object in document order
+
+Every connection gets a thread of its own, which is dropped after
+IDLE_TIMEOUT seconds without a request, and the requests themselves are
+answered on a fixed pool of worker threads.
+
+The socket lives in a directory that only its owner (or root) can write to,
+and clients only connect to a socket owned by the same user, so that another
+local user can neither listen in place of the daemon nor read the sheets.
+"""
+
+import json
+import os
+import socket
+import socketserver
+import stat
+import threading
+
+from .format import format_range, format_str
+from .parse import parse
+
+# seconds a connection may stay open without sending a request
+IDLE_TIMEOUT = 60.0
+
+
+class DaemonError(RuntimeError):
+    """The daemon answered a request with an error, or with no valid answer."""
+
+
+def default_socket_path() -> str:
+    """
+    Returns the socket path used when none is given: $CLOACAL_SOCKET if set,
+    otherwise cloacal.sock in $XDG_RUNTIME_DIR or in a per-user directory in
+    the temporary directory, which the daemon creates readable by its owner
+    only.
+    """
+    if os.environ.get("CLOACAL_SOCKET"):
+        return os.environ["CLOACAL_SOCKET"]
+    if os.environ.get("XDG_RUNTIME_DIR"):
+        return os.path.join(os.environ["XDG_RUNTIME_DIR"], "cloacal.sock")
+    import tempfile
+
+    directory = os.path.join(tempfile.gettempdir(), f"cloacal-{os.getuid()}")
+    return os.path.join(directory, "cloacal.sock")
+
+
+def _check_directory(directory):
+    # the directory must be ours (or root's, like /tmp) and nobody else may
+    # replace the socket in it, unless the sticky bit stops them
+    st = os.lstat(directory)
+    if (
+        not stat.S_ISDIR(st.st_mode)
+        or st.st_uid not in (os.getuid(), 0)
+        or (st.st_mode & 0o022 and not st.st_mode & stat.S_ISVTX)
+    ):
+        raise PermissionError(
+            f"{directory} must be a directory that only its owner can write to"
+        )
+
+
+def _check_socket(path):
+    if os.stat(path).st_uid != os.getuid():
+        raise PermissionError(f"{path} belongs to another user")
+
+
+def _format(text, width=44):
+    return format_str(text, max_line_length=width)
+
+
+def _format_range(text, start, end, width=44):
+    return format_range(text, start, end, max_line_length=width)
+
+
+def _check(text, width=44):
+    return format_str(text, max_line_length=width) == text.strip("\n")
+
+
+def _parse(text):
+    return parse(text)
+
+
+METHODS = {
+    "format": _format,
+    "format_range": _format_range,
+    "check": _check,
+    "parse": _parse,
+}
+
+
+def handle(request: dict) -> dict:
+    """
+    Answers one decoded request, the way the daemon does.
+
+    Args:
+        request (dict): A request with "method" and optional "id" and "params".
+
+    Returns:
+        dict: The response, with either a "result" or an "error".
+    """
+    response = {"id": request.get("id")}
+    method = METHODS.get(request.get("method"))
+    if method is None:
+        response["error"] = f"unknown method: {request.get('method')!r}"
+        return response
+    try:
+        response["result"] = method(**request.get("params", {}))
+    # any error, bad parameters included, is sent back to the client instead
+    # of closing its connection
+    except Exception as e:  # noqa: BLE001
+        response["error"] = f"{type(e).__name__}: {e}"
+    return response
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    timeout = IDLE_TIMEOUT
+
+    def setup(self):
+        super().setup()
+        self.server.opened(self.connection)
+
+    def handle(self):
+        try:
+            for line in self.rfile:
+                self._answer(line)
+        # the client was idle for too long, or the server is closing
+        except OSError:
+            pass
+
+    def _answer(self, line):
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            response = {"id": None, "error": f"invalid request: {e}"}
+        else:
+            if isinstance(request, dict):
+                response = self.server.answer(request)
+            else:
+                response = {"id": None, "error": "invalid request"}
+        self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+        self.wfile.flush()
+
+    def finish(self):
+        self.server.closed(self.connection)
+        super().finish()
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    A Unix socket server that reads each connection on a thread of its own
+    and answers the requests on a pool of `workers` threads. Use
+    `serve_forever` to run it and `shutdown` to stop it; `server_close`
+    also closes the connections still open.
+    """
+
+    # editors may open many connections at once; socketserver's default
+    # backlog of 5 makes clients fail to connect with EAGAIN
+    request_queue_size = 128
+    # connection threads never keep the process alive or hold up closing
+    daemon_threads = True
+    block_on_close = False
+
+    def __init__(self, path: str, workers: int = 4):
+        # imported here to keep `request`, which clients use, quick to import
+        from concurrent.futures import ThreadPoolExecutor
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        _check_directory(directory)
+        if os.path.exists(path):
+            _remove_stale_socket(path)
+        self._pool = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="cloacal"
+        )
+        self._connections = set()
+        self._lock = threading.Lock()
+        super().__init__(path, _Handler)
+
+    def answer(self, request: dict) -> dict:
+        """Answers a decoded request on the worker pool."""
+        return self._pool.submit(handle, request).result()
+
+    def opened(self, connection):
+        with self._lock:
+            self._connections.add(connection)
+
+    def closed(self, connection):
+        with self._lock:
+            self._connections.discard(connection)
+
+    def server_close(self):
+        super().server_close()
+        with self._lock:
+            connections = list(self._connections)
+        # wakes up the threads waiting for a request on these connections
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        try:
+            os.unlink(self.server_address)
+        except FileNotFoundError:
+            pass
+
+
+def _remove_stale_socket(path):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+        except OSError:
+            os.unlink(path)
+            return
+    raise FileExistsError(f"a cloacal daemon is already listening on {path}")
+
+
+def serve(path: str | None = None, workers: int = 4):
+    """
+    Runs the daemon on a Unix socket until interrupted.
+
+    Args:
+        path (str): Socket path (default: `default_socket_path()`).
+        workers (int): Number of requests answered at the same time.
+    """
+    with Server(path or default_socket_path(), workers=workers) as server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+def request(method: str, path: str | None = None, timeout: float = 5.0, **params):
+    """
+    Sends one request to a running daemon and returns its result.
+
+    Raises OSError (usually FileNotFoundError or ConnectionRefusedError) when
+    no daemon is listening, or PermissionError when the socket belongs to
+    another user, so callers can fall back to working in-process. Raises
+    DaemonError when the daemon answers with an error or with something other
+    than a response, and ValueError when the answer is not valid JSON.
+
+    Args:
+        method (str): One of "format", "check" or "parse".
+        path (str): Socket path (default: `default_socket_path()`).
+        timeout (float): Seconds to wait for the connection and the answer.
+        **params: Parameters of the method, e.g. text and width.
+    """
+    message = json.dumps({"id": 1, "method": method, "params": params})
+    path = path or default_socket_path()
+    _check_socket(path)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path)
+        sock.sendall(message.encode("utf-8") + b"\n")
+        with sock.makefile("rb") as f:
+            line = f.readline()
+    if not line:
+        raise ConnectionResetError("the cloacal daemon closed the connection")
+    response = json.loads(line)
+    if not isinstance(response, dict):
+        raise DaemonError(f"invalid response from the cloacal daemon: {line!r}")
+    if "error" in response or "result" not in response:
+        raise DaemonError(response.get("error", "the response has no result"))
+    return response["result"]
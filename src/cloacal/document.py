@@ -0,0 +1,198 @@
+from bisect import bisect_left, bisect_right
+from collections import Counter, OrderedDict
+
+from .parse import content_bounds, parse_entries
+
+# A block decides whether it is an empty list by looking at up to this many
+# lines before its end, so entries this close after an edit are reparsed.
+# That look-behind sees nothing in the first lines of a document and wraps
+# around in documents shorter than this, so edits there reparse everything.
+LOOKBEHIND = 10
+
+
+class ParsedDocument:
+    """
+    A parsed clo document that can be edited line by line without parsing it
+    again from the start.
+
+    The document remembers the lines each entry (name box, key-value pair or
+    block) was read from. `apply_edit` reparses from the entry before the edit
+    until the parser is back in step with the old entries, and splices the new
+    entries in; `data` always equals `parse(text)`.
+
+    Edits that add or remove lines move every entry after them. Instead of
+    updating all of those, the entries from `_shift_from` on store their
+    lines `_shift` lines too early, and only the entries between one edit
+    and the next are brought up to date.
+
+    Args:
+        text (str): The clo document.
+    """
+
+    def __init__(self, text: str):
+        self.lines = text.split("\n")
+        self._keys = []
+        self._values = []
+        self._starts = []
+        self._ends = []
+        for key, value, start, end in parse_entries(self.lines):
+            self._keys.append(key)
+            self._values.append(value)
+            self._starts.append(start)
+            self._ends.append(end)
+        self._shift_from = 0
+        self._shift = 0
+        self._key_counts = Counter(self._keys)
+        self.data = self._build_data()
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.lines)
+
+    def _build_data(self):
+        data = OrderedDict()
+        for key, value in zip(self._keys, self._values):
+            data[key] = value
+        return data
+
+    def _start(self, k):
+        return self._starts[k] + (self._shift if k >= self._shift_from else 0)
+
+    def _end(self, k):
+        return self._ends[k] + (self._shift if k >= self._shift_from else 0)
+
+    def _count_starts(self, line, before=False):
+        # the number of entries starting at or before `line` (before it if
+        # `before`), like bisect over the shifted starts
+        starts, split, shift = self._starts, self._shift_from, self._shift
+        if split < len(starts):
+            first_shifted = starts[split] + shift
+            if first_shifted < line or (first_shifted == line and not before):
+                find = bisect_left if before else bisect_right
+                return find(starts, line - shift, split)
+        return (bisect_left if before else bisect_right)(starts, line, 0, split)
+
+    def entries(self):
+        """
+        Returns (key, value, start, end) for every entry, where lines[start:end]
+        are the lines it was read from.
+        """
+        n = len(self._keys)
+        starts = [self._start(k) for k in range(n)]
+        ends = [self._end(k) for k in range(n)]
+        return list(zip(self._keys, self._values, starts, ends))
+
+    def entry_at(self, line: int):
+        """
+        Returns the index of the entry whose lines include `line`, or None if
+        the line is not part of any entry.
+        """
+        k = self._count_starts(line) - 1
+        if k >= 0 and line < self._end(k):
+            return k
+        return None
+
+    def entry(self, index: int):
+        """
+        Returns (key, value, start, end) for the entry at `index`, or None if
+        there is no such entry.
+        """
+        if not 0 <= index < len(self._keys):
+            return None
+        return (
+            self._keys[index],
+            self._values[index],
+            self._start(index),
+            self._end(index),
+        )
+
+    def overlapping(self, start_line: int, end_line: int) -> range:
+        """
+        Returns the indices of the entries whose lines overlap
+        lines[start_line:end_line]. An empty range selects the entry holding
+        `start_line`, if any.
+        """
+        end_line = max(end_line, start_line + 1)
+        first = self._count_starts(start_line) - 1
+        if first < 0 or self._end(first) <= start_line:
+            first += 1
+        return range(first, self._count_starts(end_line, before=True))
+
+    def apply_edit(self, start_line: int, end_line: int, new_text: str) -> range:
+        """
+        Replaces lines[start_line:end_line] with the lines of `new_text` and
+        updates `data` by reparsing only the entries around the edit.
+
+        `new_text` holds whole lines; a final newline is optional, so "" deletes
+        the lines and "\\n" replaces them with one empty line.
+
+        Returns the range of (new) line numbers that were reparsed.
+        """
+        if not 0 <= start_line <= end_line <= len(self.lines):
+            raise IndexError(f"invalid line range {start_line}:{end_line}")
+        new_lines = new_text.split("\n")
+        if new_lines[-1] == "":
+            new_lines.pop()
+        delta = len(new_lines) - (end_line - start_line)
+        old_top, old_bottom = content_bounds(self.lines)
+        self.lines[start_line:end_line] = new_lines
+        top, bottom = content_bounds(self.lines)
+
+        # restart at the entry before the one holding the edit: the edit may
+        # extend it, and a name box reads the line after its border
+        first = max(self._count_starts(start_line) - 2, 0)
+        restart = self._start(first) if first else 0
+        # entries starting at or after `stable` cannot see the edited lines
+        stable = start_line + len(new_lines) + LOOKBEHIND
+        if (
+            start_line < max(old_top, top) + LOOKBEHIND
+            or min(old_bottom - old_top, bottom - top) < LOOKBEHIND
+        ):
+            first = restart = 0
+            stable = len(self.lines) + 1
+
+        keys, values, starts, ends = [], [], [], []
+        resume = len(self._starts)  # old entry the parse got back in step with
+        stop = len(self.lines)
+        for key, value, start, end in parse_entries(self.lines, restart):
+            if start >= stable:
+                k = self._count_starts(start - delta) - 1
+                if k >= first and self._start(k) == start - delta:
+                    resume, stop = k, start
+                    break
+            keys.append(key)
+            values.append(value)
+            starts.append(start)
+            ends.append(end)
+
+        old_keys = self._keys[first:resume]
+        self._key_counts.subtract(old_keys)
+        self._key_counts.update(keys)
+        # the entries after the edit all move by delta: from now on they are
+        # the shifted ones, and only those between the old shifted entries
+        # and the edit need updating
+        split, shift = self._shift_from, self._shift
+        if shift and split < first:
+            for k in range(split, first):
+                self._starts[k] += shift
+                self._ends[k] += shift
+        elif shift and split > resume:
+            for k in range(resume, split):
+                self._starts[k] -= shift
+                self._ends[k] -= shift
+        self._keys[first:resume] = keys
+        self._values[first:resume] = values
+        self._starts[first:resume] = starts
+        self._ends[first:resume] = ends
+        self._shift_from = first + len(keys)
+        self._shift = shift + delta
+
+        if old_keys == keys and all(self._key_counts[key] == 1 for key in keys):
+            for key, value in zip(keys, values):
+                self.data[key] = value
+        else:
+            # keys were added, removed, reordered or repeated elsewhere
+            self._key_counts = +self._key_counts
+            self.data = self._build_data()
+
+        return range(restart, stop)
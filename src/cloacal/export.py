@@ -0,0 +1,148 @@
+"""
+Streams parsed sheets out of clo files as JSON Lines or TOML.
+
+Sheets are read and split one file at a time, parsed (in worker processes
+when jobs > 1) and written in input order, so no more than a bounded window
+of sheets is in memory at once, whatever the size of the corpus.
+"""
+
+import glob
+import json
+import re
+from collections import deque
+from collections.abc import Iterable, Iterator
+
+from .parse import parse_lines, split_sheets
+from .source import open_lines
+
+FORMATS = ("jsonl", "toml")
+
+BARE_KEY_PATTERN = re.compile(r"[A-Za-z0-9_-]+")
+
+
+def iter_sheet_lines(paths: Iterable[str]) -> Iterator[list[str]]:
+    """
+    Yields the lines of every sheet in the given files, in order. Paths may be
+    glob patterns.
+    """
+    for pattern in paths:
+        for path in sorted(glob.glob(pattern)) or [pattern]:
+            with open_lines(path) as lines:
+                yield from split_sheets(lines)
+
+
+def _parse_batch(batch):
+    return [parse_lines(lines) for lines in batch]
+
+
+def _batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def parse_ordered(
+    sheet_lines: Iterable[list[str]], jobs: int = 1, window: int = 16, batch: int = 64
+) -> Iterator[dict]:
+    """
+    Parses sheets given as lists of lines and yields them in input order.
+
+    With jobs > 1 the sheets are parsed by that many worker processes, in
+    batches of `batch` sheets, with at most `window` batches submitted ahead
+    of the one being yielded.
+
+    Args:
+        sheet_lines: Iterable of lists of lines, one list per sheet.
+        jobs (int): Number of worker processes (default: 1, parse in-process).
+        window (int): Maximum number of batches in flight.
+        batch (int): Number of sheets handed to a worker at a time.
+    """
+    if jobs <= 1:
+        yield from map(parse_lines, sheet_lines)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        pending = deque()
+        for sheets in _batches(sheet_lines, batch):
+            pending.append(pool.submit(_parse_batch, sheets))
+            if len(pending) >= window:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def write_jsonl(sheets: Iterable[dict], out):
+    """
+    Writes each sheet as one JSON object per line, keeping the key order.
+    """
+    for data in sheets:
+        out.write(json.dumps(data, ensure_ascii=False))
+        out.write("\n")
+
+
+def _toml_string(value):
+    # JSON strings are valid TOML basic strings, apart from a raw DEL
+    return json.dumps(value, ensure_ascii=False).replace("\x7f", "\\u007F")
+
+
+def _toml_key(key):
+    return key if BARE_KEY_PATTERN.fullmatch(key) else _toml_string(key)
+
+
+def write_toml(sheets: Iterable[dict], out):
+    """
+    Writes each sheet as a TOML table named after the character, in the shape
+    `toml2clo` reads. Sheets without a name, or with a name that was already
+    used, get a numbered table name instead.
+    """
+    seen = set()
+    for i, data in enumerate(sheets, start=1):
+        name = table = data.get("name") or f"sheet{i}"
+        # a numbered name may be taken too, by a sheet with that name or an
+        # earlier numbered one
+        n = i
+        while table in seen:
+            table = f"{name}_{n}"
+            n += 1
+        seen.add(table)
+
+        if i > 1:
+            out.write("\n")
+        out.write(f"[{_toml_string(table)}]\n")
+        for key, value in data.items():
+            if isinstance(value, list):
+                out.write(f"{_toml_key(key)} = [\n")
+                for item in value:
+                    out.write(f"    {_toml_string(item)},\n")
+                out.write("]\n")
+            else:
+                out.write(f"{_toml_key(key)} = {_toml_string(value)}\n")
+
+
+def export(
+    paths: Iterable[str], out, to: str = "jsonl", jobs: int = 1, window: int = 16
+):
+    """
+    Parses every sheet in the given clo files and writes them to `out`.
+
+    Args:
+        paths: Clo file paths or glob patterns.
+        out: Text stream to write to.
+        to (str): "jsonl" for one JSON object per line, or "toml".
+        jobs (int): Number of worker processes parsing sheets (default: 1).
+        window (int): Maximum number of batches of sheets in flight.
+    """
+    if to not in FORMATS:
+        raise ValueError(f"unknown export format: {to!r}")
+    sheets = parse_ordered(iter_sheet_lines(paths), jobs=jobs, window=window)
+    if to == "jsonl":
+        write_jsonl(sheets, out)
+    else:
+        write_toml(sheets, out)
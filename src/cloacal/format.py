@@ -1,126 +1,595 @@
-import textwrap
+import io
+import re
+from collections import namedtuple
+from functools import lru_cache
 
-from .parse import parse
+from .parse import LINE_PATTERN, parse
 
 
-def format_dict(data: dict[str, str | list], max_line_length=44):
+def is_simple_pair(key, value):
     """
-    formats the data ordereddict into a beautiful clo string.
+    tells whether a key and value are written as an aligned `key --- value`
+    line rather than as a block.
+    """
+    return (
+        key != "name"
+        and isinstance(value, str)
+        and "\n" not in value
+        and len(value.split()) <= 5
+    )
+
+
+# number of wrapped texts kept by the wrap cache
+WRAP_CACHE_SIZE = 4096
+
+WrapCacheInfo = namedtuple(
+    "WrapCacheInfo", ["hits", "misses", "maxsize", "currsize", "hit_rate"]
+)
+
+_wrappers = {}  # text wrappers by width, made on first use
+
+# whitespace that wrapping would change in a line of wrapped text: textwrap
+# turns these characters into spaces, and a run of spaces is kept as it is
+# unless a line breaks there, which joining and rewrapping the lines undoes
+REWRAPPED_SPACE_PATTERN = re.compile(r"[\t\n\x0b\x0c\r]|  ")
+
+
+def _wrapper(width):
+    wrapper = _wrappers.get(width)
+    if wrapper is None:
+        # use break_long_words=false to prevent word splitting
+        # setdefault keeps one wrapper per width when threads race here;
+        # wrappers are never changed after they are made
+        wrapper = _wrappers.setdefault(
+            width,
+            _wrapper_type()(
+                width=width,
+                break_long_words=False,
+                break_on_hyphens=False,
+            ),
+        )
+    return wrapper
+
+
+@lru_cache(maxsize=1)
+def _wrapper_type():
+    # textwrap is only needed once there are blocks to wrap
+    import textwrap
+
+    class ChunkWrapper(textwrap.TextWrapper):
+        """
+        a TextWrapper that splits a text into chunks once and wraps the
+        chunks at any width. TextWrapper.wrap is exactly split_chunks
+        followed by wrap_chunks; the two steps are the private
+        _split_chunks and _wrap_chunks hooks, unchanged since Python 3.0,
+        and test_chunk_wrapper_matches_textwrap checks them against wrap.
+        """
+
+        def split_chunks(self, text):
+            return tuple(self._split_chunks(text))
+
+        def wrap_chunks(self, chunks):
+            # _wrap_chunks pops from the list it is given
+            return tuple(self._wrap_chunks(list(chunks)))
+
+    return ChunkWrapper
+
+
+@lru_cache(maxsize=256)
+def _chunks(text):
+    # splitting a text into words and spaces does not depend on the width, so
+    # a text wrapped at several widths is only split once
+    return _wrapper(0).split_chunks(text)
+
+
+def _wrap_uncached(text, width):
+    return _wrapper(width).wrap_chunks(_chunks(text)) or ("",)
+
+
+_wrap = lru_cache(maxsize=WRAP_CACHE_SIZE)(_wrap_uncached)
+
+
+def wrap_cache_info():
+    """
+    returns the statistics of the wrap cache shared by every formatter in the
+    process, as a WrapCacheInfo with the hits, misses, maxsize, currsize and
+    hit_rate (hits over lookups, 0.0 before any lookup).
+    """
+    info = _wrap.cache_info()
+    lookups = info.hits + info.misses
+    return WrapCacheInfo(*info, info.hits / lookups if lookups else 0.0)
+
+
+def wrap_cache_clear():
+    """empties the wrap cache and resets its statistics."""
+    _wrap.cache_clear()
+
+
+def set_wrap_cache_size(maxsize):
+    """
+    sets how many wrapped texts the wrap cache keeps, dropping its contents.
+    0 turns caching off and None lets the cache grow without bound.
+
+    args:
+        maxsize: the new size cap
+    """
+    global _wrap
+    _wrap = lru_cache(maxsize=maxsize)(_wrap_uncached)
+
+
+# replaces lines[start_line:end_line] of a document with new_text, which holds
+# whole lines, each ending with a newline; the same arguments as
+# `ParsedDocument.apply_edit` takes
+TextEdit = namedtuple("TextEdit", ["start_line", "end_line", "new_text"])
+
+
+class Formatter:
+    """
+    formats clo data into beautiful clo strings at a fixed max_line_length.
+
+    everything that only depends on the width (the name box borders and dash
+    strings) is built once and reused for every sheet, so one formatter
+    should be kept around when formatting many sheets. wrapped paragraphs and
+    list items are memoized across all formatters, see `wrap_cache_info`.
 
     args:
-        data: ordereddict containing the parsed clo data
         max_line_length: maximum length for wrapped lines (default: 44)
     """
-    wrap_width = max_line_length
+
     indent = 2  # indentation for block texts
 
-    lines = []
+    def __init__(self, max_line_length=44):
+        self.max_line_length = max_line_length
+        # box borders by name length parity; the box is one narrower for odd
+        # names so that they can be perfectly centered
+        self._borders = {
+            0: "+" + "-" * (max_line_length - 2) + "+",
+            1: "+" + "-" * (max_line_length - 3) + "+",
+        }
+        self._dashes = {}  # dash strings by count
+
+    def _dash(self, count):
+        dashes = self._dashes.get(count)
+        if dashes is None:
+            dashes = self._dashes[count] = "-" * count
+        return dashes
 
-    # format the name box
-    if "name" in data:
-        name = data["name"]
+    def _wrap(self, text, width):
+        # the same paragraphs and list items come back across many sheets,
+        # so their wrapped lines are shared through an lru cache
+        return _wrap(text, width)
+
+    def _header(self, key):
+        # fill remaining space with dashes to reach max_line_length
+        # -2 for the space after key and end
+        return f"{key} {self._dash(self.max_line_length - len(key) - 2)}"
+
+    def _name_box(self, name):
         name_length = len(name)
-        # use max_line_length for box width, adjust if name length is odd
-        box_width = max_line_length if name_length % 2 == 0 else max_line_length - 1
-        top_bottom = "+" + "-" * (box_width - 2) + "+"
+        box_width = self.max_line_length - name_length % 2
+        top_bottom = self._borders[name_length % 2]
         # calculate padding needed for perfect centering
         total_padding = box_width - 4 - name_length  # -4 for "| " and " |"
         padding = " " * (total_padding // 2)
-        middle = f"| {padding}{name}{padding} |"
-        lines.append(top_bottom)
-        lines.append(middle)
-        lines.append(top_bottom)
-        lines.append("")  # blank line
-
-    # sort simple key-value pairs
-    simple_pairs = [
-        (k, v)
-        for k, v in data.items()
-        if k != "name" and isinstance(v, str) and "\n" not in v and len(v.split()) <= 5
-    ]
-    sorted_pairs = sorted(simple_pairs)
-
-    # find the longest value to align all values
-    max_value_pos = max(
-        (len(key) + 3 for key, value in sorted_pairs),  # +3 for minimum dashes
-        default=0,
-    )
+        yield top_bottom
+        yield f"| {padding}{name}{padding} |"
+        yield top_bottom
 
-    # process simple key-value pairs first
-    for key, value in sorted_pairs:
+    def _pair(self, key, value, max_value_pos):
         # calculate dashes needed to align the value at max_value_pos
-        dash_count = max_value_pos - len(key)
-        dashes = "-" * dash_count
-        line = f"{key} {dashes} {value}"
-        lines.append(line)
-
-    if simple_pairs:  # add blank line after key-value pairs if any exist
-        lines.append("")
+        return f"{key} {self._dash(max_value_pos - len(key))} {value}"
 
-    # process remaining blocks in original order
-    for key, value in data.items():
-        if key == "name" or (key, value) in simple_pairs:
-            continue
-
-        if isinstance(value, list):
+    def _block(self, key, value):
+        yield self._header(key)
+        if isinstance(value, list | tuple):
             # list block
-            # fill remaining space with dashes to reach max_line_length
-            dash_count = (
-                max_line_length - len(key) - 2
-            )  # -2 for the space after key and end
-            header_dashes = "-" * dash_count
-            header_line = f"{key} {header_dashes}"
-            lines.append(header_line)
             for item in value:
-                # calculate effective width for wrapping
-                effective_width = wrap_width - indent - 2
-                # use break_long_words=false to prevent word splitting
-                wrapped_item = textwrap.fill(
-                    item,
-                    width=effective_width,
-                    break_long_words=False,
-                    break_on_hyphens=False,
-                )
-                item_lines = wrapped_item.split("\n")
-                indented_item = [" " * indent + "> " + item_lines[0]]
-                indented_item += [" " * (indent + 2) + line for line in item_lines[1:]]
-                lines.extend(indented_item)
-            lines.append("")  # blank line after each block
+                item_lines = self._wrap(item, self.max_line_length - self.indent - 2)
+                yield " " * self.indent + "> " + item_lines[0]
+                for line in item_lines[1:]:
+                    yield " " * (self.indent + 2) + line
         else:
             # block text
-            # fill remaining space with dashes to reach max_line_length
-            dash_count = (
-                max_line_length - len(key) - 2
-            )  # -2 for the space after key and end
-            header_dashes = "-" * dash_count
-            header_line = f"{key} {header_dashes}"
-            lines.append(header_line)
-            # calculate effective width for wrapping
-            effective_width = wrap_width - indent
-            # use break_long_words=false to prevent word splitting
-            wrapped_text = textwrap.fill(
-                value,
-                width=effective_width,
-                break_long_words=False,
-                break_on_hyphens=False,
+            for line in self._wrap(value, self.max_line_length - self.indent):
+                yield " " * self.indent + line
+
+    def _pair_lines(self, data):
+        """
+        returns the aligned simple pair lines of a sheet and the set of their
+        keys. neither depends on the width.
+        """
+        # sort simple key-value pairs
+        simple_pairs = sorted((k, v) for k, v in data.items() if is_simple_pair(k, v))
+
+        # find the longest key to align all values
+        max_value_pos = max(
+            (len(key) + 3 for key, _ in simple_pairs),  # +3 for minimum dashes
+            default=0,
+        )
+        lines = [self._pair(key, value, max_value_pos) for key, value in simple_pairs]
+        return lines, {key for key, _ in simple_pairs}
+
+    def _lines(self, data, pairs=None):
+        """
+        yields the lines of the formatted sheet, before trailing spaces and
+        surrounding blank lines are removed.
+
+        args:
+            data: ordereddict containing the parsed clo data
+            pairs: the result of `_pair_lines(data)`, if already known
+        """
+
+        # format the name box
+        if "name" in data:
+            yield from self._name_box(data["name"])
+            yield ""  # blank line
+
+        # process simple key-value pairs first
+        pair_lines, simple_keys = pairs or self._pair_lines(data)
+        yield from pair_lines
+
+        if pair_lines:  # add blank line after key-value pairs if any exist
+            yield ""
+
+        # process remaining blocks in original order
+        for key, value in data.items():
+            if key == "name" or key in simple_keys:
+                continue
+            yield from self._block(key, value)
+            yield ""  # blank line after each block
+
+    def is_formatted(self, text):
+        """
+        tells whether formatting `text` would give `text` back, by checking
+        it line by line against what `format` writes, without parsing it or
+        wrapping anything: the name box, the sorted and aligned simple pairs,
+        the block headers and where each block's lines break.
+
+        returns False as soon as a line differs, and also whenever a line
+        could be read in more than one way (lines of block text that look
+        like pairs or list items, empty values, repeated keys, a "name" key
+        outside the name box), so that those are left to the full formatter.
+
+        args:
+            text: a clo string without blank lines at the start or end
+        """
+        lines = text.split("\n")
+        n = len(lines)
+        if not lines[0] or not lines[-1]:
+            return False
+        keys = set()
+        i = 0
+
+        if lines[0].startswith("+"):
+            name = lines[1].strip().strip("|").strip() if n > 1 else ""
+            if lines[:3] != list(self._name_box(name)):
+                return False
+            keys.add("name")
+            i = 3
+            if i < n:
+                if lines[i]:
+                    return False
+                i += 1
+
+        # simple pairs, one right after the other
+        pairs_start = i
+        pairs = []
+        while i < n and lines[i]:
+            m = LINE_PATTERN.match(lines[i])
+            if not m or not m.group(2):
+                break
+            pairs.append((m.group(1), m.group(2).rstrip()))
+            i += 1
+        if pairs:
+            max_value_pos = max(len(key) for key, _ in pairs) + 3
+            previous = None
+            for line, (key, value) in zip(lines[pairs_start:i], pairs):
+                if (
+                    (previous is not None and key <= previous)
+                    or not is_simple_pair(key, value)
+                    or line != self._pair(key, value, max_value_pos)
+                ):
+                    return False
+                previous = key
+            keys.update(key for key, _ in pairs)
+            if i < n:
+                if lines[i]:
+                    return False
+                i += 1
+
+        # blocks, each followed by a blank line
+        while i < n:
+            m = LINE_PATTERN.match(lines[i])
+            if not m or m.group(2):
+                return False
+            key = m.group(1)
+            if key == "name" or key in keys or lines[i] != self._header(key):
+                return False
+            keys.add(key)
+            start = i = i + 1
+            while i < n and lines[i]:
+                i += 1
+            if not self._is_formatted_block(key, lines[start:i]):
+                return False
+            i += 1
+        return True
+
+    def _is_formatted_block(self, key, lines):
+        # the lines under a block header, as far as the next blank line
+        if not lines or any(map(LINE_PATTERN.match, lines)):
+            return False  # a line that looks like a pair would end the block
+
+        if not lines[0].lstrip().startswith(">"):
+            # block text, which is written as a simple pair when it is short
+            if not all(line.startswith("  ") for line in lines):
+                return False
+            texts = [line[2:] for line in lines]
+            if not self._is_wrapped(texts, self.max_line_length - self.indent):
+                return False
+            # counted like the formatter counts, which splits on any
+            # whitespace, not only spaces
+            return not is_simple_pair(key, " ".join(texts))
+
+        items = []  # the lines of each list item
+        for line in lines:
+            if line == "  >":
+                items.append([""])
+            elif line.startswith("  > ") and len(line) > 4:
+                items.append([line[4:]])
+            elif items and line.startswith("    "):
+                items[-1].append(line[4:])
+            else:
+                return False
+        width = self.max_line_length - self.indent - 2
+        return all(texts == [""] or self._is_wrapped(texts, width) for texts in items)
+
+    @staticmethod
+    def _is_wrapped(texts, width):
+        # whether wrapping the joined texts at width gives the texts back:
+        # every line is as long as it can be without going over the width,
+        # or holds one long word on its own
+        if width <= 0:
+            return False
+        for j, text in enumerate(texts):
+            if (
+                not text
+                or text != text.strip()
+                or text.startswith(">")
+                or REWRAPPED_SPACE_PATTERN.search(text)
+                or (len(text) > width and " " in text)
+            ):
+                return False
+            if j and len(texts[j - 1]) + len(text.split(" ", 1)[0]) < width:
+                return False
+        return True
+
+    def write(self, data, out):
+        """
+        writes the data ordereddict as a beautiful clo string to the text
+        stream `out`, line by line as the lines are produced.
+
+        the output is exactly what `format` returns: it has no trailing
+        newline, and blank lines are held back until the next non-blank line
+        so that none are written at the start or end.
+
+        args:
+            data: ordereddict containing the parsed clo data
+            out: file-like object to write to
+        """
+        self._write_lines(self._lines(data), out)
+
+    def _write_lines(self, lines, out):
+        started = False
+        blank_lines = 0
+        for line in lines:
+            # remove any trailing spaces from each line
+            line = line.rstrip()
+            if not line:
+                blank_lines += started
+                continue
+            if started:
+                out.write("\n" * (blank_lines + 1))
+            out.write(line)
+            started = True
+            blank_lines = 0
+
+    def format(self, data):
+        """
+        formats the data ordereddict into a beautiful clo string.
+
+        args:
+            data: ordereddict containing the parsed clo data
+        """
+        buffer = io.StringIO()
+        self.write(data, buffer)
+        return buffer.getvalue()
+
+    def format_many(self, sheets, out=None):
+        """
+        formats many sheets with the same settings.
+
+        returns the formatted strings as a list, or, when a writable text
+        file `out` is given, writes them to it one after another separated by
+        blank lines instead of keeping them in memory.
+
+        args:
+            sheets: iterable of ordereddicts containing parsed clo data
+            out: optional file-like object to write the sheets to
+        """
+        if out is None:
+            return [self.format(data) for data in sheets]
+        for i, data in enumerate(sheets):
+            if i:
+                out.write("\n")
+            self.write(data, out)
+            out.write("\n")
+
+    def format_range(self, document, start_line, end_line):
+        """
+        formats only the entries of a document whose lines overlap
+        lines[start_line:end_line] and returns the changes as text edits.
+
+        each entry (name box, key-value pair or block) is formatted where it
+        stands: pairs are aligned with every simple pair in the document and
+        blocks are wrapped, but nothing is moved, so lines outside the
+        formatted entries stay byte-for-byte the same. entries that are
+        already formatted give no edit, and the edits only cover the lines
+        that actually change.
+
+        args:
+            document: ParsedDocument to format
+            start_line: first line of the range (0-based)
+            end_line: line after the last line of the range
+
+        returns a list of TextEdits in document order, based on the lines
+        before any of them is applied.
+        """
+        lines = document.lines
+        n = len(lines)
+        max_value_pos = max(
+            (len(k) + 3 for k, v in document.data.items() if is_simple_pair(k, v)),
+            default=0,
+        )
+
+        changes = []  # (start, end, new lines)
+        for index in document.overlapping(start_line, end_line):
+            key, value, start, end = document.entry(index)
+            if key == "name":
+                new_lines = list(self._name_box(value))
+            elif is_simple_pair(key, value):
+                new_lines = [self._pair(key, value, max_value_pos)]
+            else:
+                new_lines = [line.rstrip() for line in self._block(key, value)]
+
+            # the blank lines after an entry are formatted with it: one blank
+            # line, or none between two pairs and at the end of the document
+            while end < n and not lines[end].strip():
+                end += 1
+            if end == n:
+                while end > start and not lines[end - 1].strip():
+                    end -= 1
+            else:
+                following = document.entry(index + 1)
+                if not (
+                    key != "name"
+                    and is_simple_pair(key, value)
+                    and following is not None
+                    and is_simple_pair(*following[:2])
+                ):
+                    new_lines.append("")
+
+            if new_lines == lines[start:end]:
+                continue
+            if changes and changes[-1][1] == start:
+                changes[-1][1:] = [end, changes[-1][2] + new_lines]
+            else:
+                changes.append([start, end, new_lines])
+
+        edits = []
+        for start, end, new_lines in changes:
+            # leave out lines that the edit would not change
+            while start < end and new_lines and new_lines[0] == lines[start]:
+                start += 1
+                new_lines = new_lines[1:]
+            while start < end and new_lines and new_lines[-1] == lines[end - 1]:
+                end -= 1
+                new_lines = new_lines[:-1]
+            edits.append(
+                TextEdit(start, end, "".join(line + "\n" for line in new_lines))
             )
-            indented_lines = [" " * indent + line for line in wrapped_text.split("\n")]
-            lines.extend(indented_lines)
-            lines.append("")  # blank line after each block
+        return edits
+
 
-    # remove any trailing spaces from each line and join with newlines
-    formatted_text = "\n".join(line.rstrip() for line in lines)
-    # ensure single trailing newline
-    return formatted_text.strip("\n")
+@lru_cache(maxsize=16)
+def _formatter(max_line_length):
+    return Formatter(max_line_length)
+
+
+def format_dict(data: dict[str, str | list], max_line_length=44):
+    """
+    formats the data ordereddict into a beautiful clo string.
+
+    args:
+        data: ordereddict containing the parsed clo data
+        max_line_length: maximum length for wrapped lines (default: 44)
+    """
+    return _formatter(max_line_length).format(data)
+
+
+def format_widths(data: dict[str, str | list], widths=(44,)):
+    """
+    formats the data ordereddict at several line lengths at once and returns
+    a dict mapping each width to its formatted string.
+
+    the simple pairs are sorted and aligned once for all widths, and every
+    block is split into words once and then wrapped at each width.
+
+    args:
+        data: ordereddict containing the parsed clo data
+        widths: the maximum line lengths to format at (default: 44 only)
+    """
+    formatters = [_formatter(width) for width in widths]
+    if not formatters:
+        return {}
+    pairs = formatters[0]._pair_lines(data)
+    formatted = {}
+    for formatter in formatters:
+        buffer = io.StringIO()
+        formatter._write_lines(formatter._lines(data, pairs), buffer)
+        formatted[formatter.max_line_length] = buffer.getvalue()
+    return formatted
 
 
 def format_str(input_text, max_line_length=44):
     """
     takes an ugly clo input string and returns a nicely formatted clo string.
 
+    input that is already formatted is only checked, with
+    `Formatter.is_formatted`, and comes back as it is.
+
     args:
         input_text: the input clo string to format
         max_line_length: maximum length for wrapped lines (default: 44)
     """
-    data = parse(input_text)
-    return format_dict(data, max_line_length=max_line_length)
+    text = input_text.strip("\n")
+    formatter = _formatter(max_line_length)
+    if formatter.is_formatted(text):
+        return text
+    return formatter.format(parse(text))
+
+
+def format_range(input_text, start_line, end_line, max_line_length=44):
+    """
+    formats only the entries overlapping lines[start_line:end_line] of a clo
+    string and returns the changes as a list of TextEdits. see
+    `Formatter.format_range`.
+
+    args:
+        input_text: the clo string, or a ParsedDocument holding it (which
+            editors can keep around to skip parsing the whole text again)
+        start_line: first line of the range (0-based)
+        end_line: line after the last line of the range
+        max_line_length: maximum length for wrapped lines (default: 44)
+    """
+    # imported here so that formatting whole sheets doesn't load it
+    from .document import ParsedDocument
+
+    if isinstance(input_text, ParsedDocument):
+        document = input_text
+    else:
+        document = ParsedDocument(input_text)
+    return _formatter(max_line_length).format_range(document, start_line, end_line)
+
+
+def apply_edits(input_text, edits):
+    """
+    returns the clo string with the text edits from `format_range` applied.
+
+    args:
+        input_text: the clo string the edits were made for
+        edits: list of TextEdits, in document order
+    """
+    lines = input_text.split("\n")
+    for start, end, new_text in reversed(edits):
+        lines[start:end] = new_text.split("\n")[:-1]
+    return "\n".join(lines)
@@ -0,0 +1,86 @@
+"""
+Asks the local git repository which files a change touches, so that only
+those need formatting.
+"""
+
+from fnmatch import fnmatchcase
+from pathlib import PurePosixPath
+
+
+class GitError(RuntimeError):
+    """A git command failed, for example outside of a repository."""
+
+
+def _git(*args, cwd=None):
+    # imported here so that bundles can match paths without loading it
+    import subprocess
+
+    try:
+        result = subprocess.run(
+            ["git", *args], capture_output=True, text=True, cwd=cwd, check=False
+        )
+    except FileNotFoundError as e:
+        raise GitError("git is not installed") from e
+    if result.returncode:
+        raise GitError(result.stderr.strip() or f"git {args[0]} failed")
+    return [path for path in result.stdout.split("\0") if path]
+
+
+def _match(parts, pattern):
+    # "**" stands for any number of directories, other parts for one each
+    if not pattern:
+        return not parts
+    if pattern[0] == "**":
+        return any(_match(parts[i:], pattern[1:]) for i in range(len(parts) + 1))
+    return (
+        bool(parts)
+        and fnmatchcase(parts[0], pattern[0])
+        and _match(parts[1:], pattern[1:])
+    )
+
+
+def path_matches(path: str, pattern: str) -> bool:
+    """
+    Tells whether a relative path matches a pattern. A pattern without a
+    slash matches file names in any directory, one with a slash the whole
+    path, where "**" stands for any number of directories.
+    """
+    parts = PurePosixPath(path).parts
+    if "/" not in pattern:
+        return fnmatchcase(parts[-1], pattern)
+    return _match(parts, PurePosixPath(pattern).parts)
+
+
+def changed_files(
+    since: str | None = None,
+    staged: bool = False,
+    pattern: str = "*.clo",
+    cwd: str | None = None,
+) -> list[str]:
+    """
+    Returns the added, copied, modified or renamed files matching `pattern`,
+    relative to the current directory and below it.
+
+    Args:
+        since (str | None): A commit, branch or tag. Files that differ between
+            it and the working tree count as changed, as do untracked files.
+        staged (bool): Count the files staged for the next commit.
+        pattern (str): Pattern the paths must match. "*.clo" matches .clo
+            files in any directory, "sheets/*.clo" those in sheets/ and
+            "sheets/**/*.clo" those anywhere below it (default: "*.clo").
+        cwd (str | None): Directory to run git in (default: the current one).
+
+    Raises:
+        GitError: If git fails, for example when `since` is not a valid
+            revision or the directory is not in a git repository.
+    """
+    diff = ["diff", "--name-only", "--diff-filter=ACMR", "--relative", "-z"]
+    paths = []
+    if staged:
+        paths += _git(*diff, "--cached", cwd=cwd)
+    if since is not None:
+        # --end-of-options keeps a revision starting with "-" from being
+        # taken for an option
+        paths += _git(*diff, "--end-of-options", since, "--", cwd=cwd)
+        paths += _git("ls-files", "--others", "--exclude-standard", "-z", cwd=cwd)
+    return sorted(path for path in set(paths) if path_matches(path, pattern))
@@ -0,0 +1,334 @@
+"""
+A packed archive holding many formatted sheets in one file.
+
+The archive starts with MAGIC, followed by the sheets one after another
+(each one zlib-compressed or not, on its own), the names and paths of the
+sheets, an index and a trailer:
+
+    MAGIC | sheet | sheet | ... | names and paths | index | trailer
+
+The index has one fixed-size record per sheet, sorted by character name, so
+`Archive.find` looks a sheet up with a binary search over the records on
+disk and then reads only that sheet. The trailer at the very end of the file
+gives where the names and the index start and how many sheets there are.
+"""
+
+import contextlib
+import os
+import struct
+import zlib
+from collections import OrderedDict, namedtuple
+from collections.abc import Iterable, Iterator
+
+from .format import format_dict
+from .parse import parse, parse_lines, split_sheets
+
+MAGIC = b"CLOPACK\x01"
+
+# data offset, data length, key offset, name length, path length, flags
+RECORD = struct.Struct("<QQQIIB")
+# key offset, index offset, sheet count, magic
+TRAILER = struct.Struct("<QQQ8s")
+
+COMPRESSED = 1  # record flag: the sheet is zlib-compressed
+
+ArchiveEntry = namedtuple(
+    "ArchiveEntry", ["name", "path", "offset", "length", "compressed"]
+)
+
+
+class ArchiveError(ValueError):
+    """The file is not a valid cloacal archive."""
+
+
+def is_archive(path: str) -> bool:
+    """Tells whether the file at `path` starts like a cloacal archive."""
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def write_archive(
+    path: str, sheets: Iterable[tuple[str, str, str]], compress: bool = False
+) -> int:
+    """
+    Writes sheets to a new archive and returns how many there were. Sheets
+    are written as they come, so only their index records are kept in
+    memory.
+
+    Args:
+        path (str): The archive to write.
+        sheets: (name, path, text) for every sheet, where path is the .clo
+            file the sheet belongs to when unpacked.
+        compress (bool): Compress every sheet that gets smaller with zlib.
+    """
+    records = []
+    keys = []
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        offset = len(MAGIC)
+        key_offset = 0
+        for name, sheet_path, text in sheets:
+            data = text.encode()
+            flags = 0
+            if compress:
+                packed = zlib.compress(data)
+                if len(packed) < len(data):
+                    data, flags = packed, COMPRESSED
+            f.write(data)
+
+            name_bytes, path_bytes = name.encode(), sheet_path.encode()
+            records.append(
+                (
+                    name_bytes,
+                    len(records),
+                    (offset, len(data), key_offset, len(name_bytes), len(path_bytes)),
+                    flags,
+                )
+            )
+            keys.append(name_bytes + path_bytes)
+            offset += len(data)
+            key_offset += len(name_bytes) + len(path_bytes)
+
+        keys_start = offset
+        f.write(b"".join(keys))
+        index_start = keys_start + key_offset
+        # sorted by name, then archive order, for the binary search
+        for _, _, fields, flags in sorted(records):
+            data_offset, length, key, name_length, path_length = fields
+            f.write(
+                RECORD.pack(data_offset, length, key, name_length, path_length, flags)
+            )
+        f.write(TRAILER.pack(keys_start, index_start, len(records), MAGIC))
+    return len(records)
+
+
+class Archive:
+    """
+    Reads a cloacal archive. Use as a context manager, or call `close`.
+
+    Args:
+        path (str): The archive to read.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        # the file stays open for the lifetime of the archive, until close()
+        self._file = open(path, "rb")  # noqa: SIM115
+        try:
+            self._file.seek(0, os.SEEK_END)
+            size = self._file.tell()
+            if size < len(MAGIC) + TRAILER.size:
+                raise ArchiveError(f"{path} is not a cloacal archive")
+            self._file.seek(size - TRAILER.size)
+            self._keys, self._index, self._count, magic = TRAILER.unpack(
+                self._file.read(TRAILER.size)
+            )
+            if magic != MAGIC:
+                raise ArchiveError(f"{path} is not a cloacal archive")
+            # the sheets, the keys and the index fill the file between the
+            # magic and the trailer, in that order
+            if not (
+                len(MAGIC) <= self._keys <= self._index
+                and self._index + self._count * RECORD.size == size - TRAILER.size
+            ):
+                raise ArchiveError(f"{path} is corrupt: the trailer does not fit")
+        except BaseException:
+            self._file.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._file.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _corrupt(self, what):
+        return ArchiveError(f"{self.path} is corrupt: {what}")
+
+    def _read_key(self, key, length):
+        if self._keys + key + length > self._index:
+            raise self._corrupt("a name lies outside the names")
+        self._file.seek(self._keys + key)
+        return self._file.read(length)
+
+    def _entry(self, fields):
+        offset, length, key, name_length, path_length, flags = fields
+        if not len(MAGIC) <= offset <= offset + length <= self._keys:
+            raise self._corrupt("a sheet lies outside the sheets")
+        key_bytes = self._read_key(key, name_length + path_length)
+        try:
+            name = key_bytes[:name_length].decode()
+            path = key_bytes[name_length:].decode()
+        except UnicodeDecodeError as e:
+            raise self._corrupt(e) from e
+        return ArchiveEntry(name, path, offset, length, bool(flags & COMPRESSED))
+
+    def _record(self, i):
+        self._file.seek(self._index + i * RECORD.size)
+        return RECORD.unpack(self._file.read(RECORD.size))
+
+    def _name(self, i):
+        _, _, key, name_length, _, _ = self._record(i)
+        return self._read_key(key, name_length)
+
+    def find(self, name: str) -> ArchiveEntry | None:
+        """
+        Returns the entry of the first sheet with the given character name,
+        or None, reading only about log2(len(archive)) index records.
+        """
+        target = name.encode()
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._name(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._count and self._name(lo) == target:
+            return self._entry(self._record(lo))
+        return None
+
+    def entries(self) -> list[ArchiveEntry]:
+        """Returns the entries of every sheet, in the order they were packed."""
+        self._file.seek(self._index)
+        index = self._file.read(self._count * RECORD.size)
+        records = sorted(RECORD.iter_unpack(index))
+        return [self._entry(fields) for fields in records]
+
+    def names(self) -> list[str]:
+        """Returns the character names of the sheets, in packing order."""
+        return [entry.name for entry in self.entries()]
+
+    def read(self, entry: ArchiveEntry) -> str:
+        """Returns the text of a sheet."""
+        self._file.seek(entry.offset)
+        data = self._file.read(entry.length)
+        try:
+            if entry.compressed:
+                data = zlib.decompress(data)
+            return data.decode()
+        except (zlib.error, UnicodeDecodeError) as e:
+            raise self._corrupt(f"sheet {entry.name!r}: {e}") from e
+
+    def __iter__(self) -> Iterator[tuple[ArchiveEntry, str]]:
+        """Yields (entry, text) for every sheet, in packing order."""
+        for entry in self.entries():
+            yield entry, self.read(entry)
+
+
+def load_from_archive(path: str, name: str) -> OrderedDict[str, str | list[str]]:
+    """
+    Parses the sheet of the character `name` from an archive, reading only
+    that sheet and a few index records.
+
+    Raises:
+        KeyError: If no sheet in the archive has that name.
+    """
+    with Archive(path) as archive:
+        entry = archive.find(name)
+        if entry is None:
+            raise KeyError(name)
+        return parse(archive.read(entry))
+
+
+def pack(
+    paths: Iterable[str], archive_path: str, compress: bool = False, width: int = 44
+) -> int:
+    """
+    Formats every sheet in the given .clo files and packs them into a new
+    archive, returning the number of sheets.
+
+    Every sheet is stored with the path of its file relative to the current
+    directory, or, when some files lie outside of it, relative to the
+    deepest directory holding them all, so that `unpack` can write them
+    back under any directory.
+
+    Args:
+        paths: The .clo files to pack.
+        archive_path (str): The archive to write.
+        compress (bool): Compress sheets with zlib.
+        width (int): Maximum line width for formatting (default: 44).
+    """
+    from .source import open_lines
+
+    paths = [os.path.abspath(path) for path in paths]
+    root = os.getcwd()
+    if paths and os.path.commonpath([root, *paths]) != root:
+        root = os.path.commonpath([os.path.dirname(path) for path in paths])
+
+    def sheets():
+        for path in paths:
+            with open_lines(path) as lines:
+                for sheet_lines in split_sheets(lines):
+                    data = parse_lines(sheet_lines)
+                    text = format_dict(data, max_line_length=width)
+                    yield data.get("name", ""), os.path.relpath(path, root), text
+
+    return write_archive(archive_path, sheets(), compress=compress)
+
+
+def _safe_path(directory, path):
+    if os.path.isabs(path) or ".." in path.replace("\\", "/").split("/"):
+        raise ArchiveError(f"refusing to unpack outside the target: {path}")
+    return os.path.join(directory, path)
+
+
+def unpack(archive_path: str, directory: str = ".") -> list[str]:
+    """
+    Writes the sheets of an archive back to .clo files under `directory`,
+    with the sheets that came from one file written to it one after another,
+    and returns the paths written.
+    """
+    written = OrderedDict()
+    with Archive(archive_path) as archive:
+        for entry, text in archive:
+            target = _safe_path(directory, entry.path)
+            mode = "a" if target in written else "w"
+            if mode == "w":
+                os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+            with open(target, mode) as f:
+                if mode == "a":
+                    f.write("\n")
+                f.write(text + "\n")
+            written[target] = True
+    return list(written)
+
+
+def format_archive(path: str, output: str | None = None, width: int = 44) -> int:
+    """
+    Formats every sheet of an archive, writing a new archive to `output`, or
+    replacing the archive itself when no output is given. Returns the number
+    of sheets.
+    """
+    target = output or path
+    temporary = f"{target}.tmp{os.getpid()}"
+    with Archive(path) as archive:
+        compress = any(entry.compressed for entry in archive.entries())
+
+        def sheets():
+            for entry, text in archive:
+                data = parse(text)
+                yield (
+                    data.get("name", ""),
+                    entry.path,
+                    format_dict(data, max_line_length=width),
+                )
+
+        try:
+            count = write_archive(temporary, sheets(), compress=compress)
+        except BaseException:
+            # the error that stopped the writing is the one to report
+            with contextlib.suppress(OSError):
+                os.remove(temporary)
+            raise
+    os.replace(temporary, target)
+    return count
@@ -1,25 +1,161 @@
 import re
-from collections import OrderedDict
+from collections import OrderedDict, namedtuple
+from itertools import pairwise
 
+# Matches block headers (e.g., description ----) and key-value pairs (e.g.,
+# age -- 99), with the rest of the line after the separator in group 2: empty
+# for a header. Every quantifier is possessive and the character classes on
+# either side of each one are disjoint, so the match never backtracks and
+# takes time linear in the length of the line.
+LINE_PATTERN = re.compile(r"\s*+(\w++)\s*+[-~>*]++\s*+(.*)")
 
-def parse(input_text):
+# Matches lines starting a list item, without copying the line like strip()
+LIST_ITEM_PATTERN = re.compile(r"\s*+>")
+
+# Limits for parsing untrusted input; None means no limit. max_block_lines
+# counts the lines of a block including its header, and max_keys counts
+# every entry, repeated keys included.
+Limits = namedtuple(
+    "Limits", ["max_line_length", "max_block_lines", "max_keys"], defaults=(None,) * 3
+)
+
+
+class ParseLimitError(ValueError):
+    """The input is larger than the parsing limits allow."""
+
+
+def parse(input_text, limits=None):
     """
     Parses the clo input text and returns an OrderedDict representing the data.
+
+    Args:
+        input_text (str): The clo input text.
+        limits (Limits): Optional limits to enforce on the input.
+
+    Raises:
+        ParseLimitError: If the input goes over one of the limits.
     """
+    return parse_lines(input_text.strip("\n").split("\n"), limits=limits)
 
-    lines = input_text.strip("\n").split("\n")
+
+def content_bounds(lines):
+    """
+    Returns (first, last) such that lines[first:last] are the lines without
+    the empty lines before and after them, the ones `parse` strips.
+    """
+    first, last = 0, len(lines)
+    while first < last and lines[first] == "":
+        first += 1
+    while last > first and lines[last - 1] == "":
+        last -= 1
+    return first, last
+
+
+def split_sheets(lines):
+    """
+    Splits a sequence of clo lines holding several sheets into one list of
+    lines per sheet, without parsing them.
+
+    A new sheet starts at every name box whose top border starts at the very
+    beginning of a line, which is how formatted sheets are written one after
+    another. Empty lines around each sheet are dropped, so every list can be
+    passed straight to `parse_lines`.
+    """
+    starts = [0]
+    for i in range(1, len(lines) - 1):
+        if lines[i].startswith("+") and lines[i + 1].lstrip().startswith("|"):
+            starts.append(i)
+    starts.append(len(lines))
+
+    for start, end in pairwise(starts):
+        while start < end and lines[start] == "":
+            start += 1
+        while end > start and lines[end - 1] == "":
+            end -= 1
+        if start < end:
+            yield lines[start:end]
+
+
+def parse_sheets(input_text, limits=None):
+    """
+    Parses clo input text holding any number of sheets and returns a list with
+    an OrderedDict for each of them. See `split_sheets` for where sheets begin.
+    The limits, if given, apply to each sheet.
+    """
+    return [
+        parse_lines(lines, limits=limits)
+        for lines in split_sheets(input_text.split("\n"))
+    ]
+
+
+def parse_lines(lines, limits=None):
+    """
+    Parses a sequence of clo lines and returns an OrderedDict representing the data.
+
+    The lines must already have leading and trailing blank lines removed, as
+    `parse` does. Any sequence of strings works, including the memory-mapped
+    lines yielded by `cloacal.source.open_lines`.
+    """
     data = OrderedDict()
-    i = 0
+    for key, value, _, _ in parse_entries(lines, limits=limits):
+        data[key] = value
+    return data
+
+
+def _check_line(lines, i, max_line_length):
+    line = lines[i]
+    if max_line_length is not None and len(line) > max_line_length:
+        raise ParseLimitError(
+            f"line {i + 1} is {len(line)} characters long, "
+            f"more than the limit of {max_line_length}"
+        )
+    return line
+
+
+def parse_entries(lines, start=0, limits=None):
+    """
+    Parses a sequence of clo lines and yields (key, value, start, end) for every
+    entry in document order, where lines[start:end] are the lines the entry was
+    read from. Blank lines after an entry belong to it; lines that are skipped
+    between entries belong to none.
+
+    Parsing starts at line `start`, which must be 0 or the start of an entry.
+
+    Every line is looked at a bounded number of times, and only in ways that
+    take time linear in its length, so parsing takes time linear in the size
+    of the input whatever it holds.
+
+    Raises:
+        ParseLimitError: If the input goes over one of the `limits`.
+    """
+    i = start
     n = len(lines)
+    max_line_length, max_block_lines, max_keys = limits or Limits()
+    keys = 0
+    bounds = None
 
-    # Patterns to match block headers and key-value pairs
-    block_header_pattern = re.compile(r"^\s*(\w+)\s*[-~>*]+\s*$")
-    key_value_pattern = re.compile(
-        r"^\s*(\w+)\s*[-~>*]+\s*(.+)$"
-    )  # Accept various separators
+    def lookback(end):
+        # the lines an empty block looks at for list markers: the ten lines
+        # before its end in the lines `parse` keeps, where a window starting
+        # before the first of them wraps around to the end, as slicing does
+        nonlocal bounds
+        if bounds is None:
+            bounds = content_bounds(lines)
+        first, last = bounds
+        stop = min(end, last) - first
+        begin = stop - 10
+        if begin < 0:
+            begin = max(begin + last - first, 0)
+        return lines[first + begin : first + stop] if begin < stop else []
+
+    def count_key():
+        nonlocal keys
+        keys += 1
+        if max_keys is not None and keys > max_keys:
+            raise ParseLimitError(f"more than the limit of {max_keys} keys")
 
     while i < n:
-        line = lines[i]
+        line = _check_line(lines, i, max_line_length)
         stripped_line = line.strip()
 
         # Skip empty lines
@@ -30,10 +166,11 @@ def parse(input_text):
         # Check for name box
         if stripped_line.startswith("+"):
             # Name box detected
-            if i + 1 < n and lines[i + 1].strip().startswith("|"):
-                name_line = lines[i + 1].strip()
+            if i + 1 < n and lines[i + 1].lstrip().startswith("|"):
+                name_line = _check_line(lines, i + 1, max_line_length).strip()
                 name = name_line.strip("|").strip()
-                data["name"] = name
+                count_key()
+                yield "name", name, i, min(i + 3, n)
                 i += 3  # Skip the name box lines (+, | name |, +)
                 continue
             else:
@@ -41,26 +178,31 @@ def parse(input_text):
                 continue
 
         # Check for block header (e.g., description ----)
-        m = block_header_pattern.match(line)
-        if m:
+        m = LINE_PATTERN.match(line)
+        if m and not m.group(2):
             key = m.group(1)
+            entry_start = i
             i += 1
             block_lines = []
             list_items = []
             while i < n:
-                block_line = lines[i]
+                block_line = _check_line(lines, i, max_line_length)
                 stripped_block_line = block_line.strip()
 
+                # Check if this line is a new block header or key-value pair
+                if LINE_PATTERN.match(block_line):
+                    break  # New block or key-value pair detected
+
+                if max_block_lines is not None and i - entry_start >= max_block_lines:
+                    raise ParseLimitError(
+                        f"block {key!r} on line {entry_start + 1} is longer "
+                        f"than the limit of {max_block_lines} lines"
+                    )
+
                 if not stripped_block_line:
                     i += 1
                     continue
 
-                # Check if this line is a new block header or key-value pair
-                new_block_match = block_header_pattern.match(block_line)
-                new_kv_match = key_value_pattern.match(block_line)
-                if new_block_match or new_kv_match:
-                    break  # New block or key-value pair detected
-
                 if stripped_block_line.startswith(">"):
                     # Start of a new list item
                     current_item_lines = []
@@ -72,20 +214,21 @@ def parse(input_text):
 
                     # Collect continuation lines and subtasks for this item
                     while i < n:
-                        next_line = lines[i].rstrip()
+                        if (
+                            max_block_lines is not None
+                            and i - entry_start >= max_block_lines
+                        ):
+                            break  # reported by the block loop
+                        next_line = _check_line(lines, i, max_line_length).rstrip()
                         if not next_line.strip():
                             i += 1
                             continue
 
                         # Check if this is a new top-level list item or block
                         if (
-                            (
-                                next_line.strip().startswith(">")
-                                and not next_line.startswith("        >")
-                            )
-                            or block_header_pattern.match(next_line)
-                            or key_value_pattern.match(next_line)
-                        ):
+                            next_line.strip().startswith(">")
+                            and not next_line.startswith("        >")
+                        ) or LINE_PATTERN.match(next_line):
                             break
 
                         # If it's a subtask (more indented '>')
@@ -110,32 +253,27 @@ def parse(input_text):
                     i += 1
                 else:
                     i += 1  # Skip unrecognized lines within a block
-            # Check if this is a list block by looking for any '>' markers
-            is_list_block = any(
-                line.strip().startswith(">") for line in lines[i - 10 : i]
-            )
-
+            count_key()
             if list_items:
-                data[key] = list_items
+                yield key, list_items, entry_start, i
             elif block_lines:
                 block_text = " ".join(block_lines)
-                data[key] = block_text
-            elif is_list_block:
-                data[key] = []  # Empty list block
+                yield key, block_text, entry_start, i
+            elif any(map(LIST_ITEM_PATTERN.match, lookback(i))):
+                # a list block is told apart by any '>' markers before its end
+                yield key, [], entry_start, i  # Empty list block
             else:
-                data[key] = ""  # Empty text block
+                yield key, "", entry_start, i  # Empty text block
             continue
 
         # Check for key-value pair with value (e.g., age -- 99)
-        m = key_value_pattern.match(line)
         if m:
             key = m.group(1)
-            value = m.group(2).strip()
-            data[key] = value
+            value = m.group(2).rstrip()
+            count_key()
+            yield key, value, i, i + 1
             i += 1
             continue
 
         # Unrecognized line, skip it
         i += 1
-
-    return data
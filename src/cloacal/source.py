@@ -0,0 +1,147 @@
+import mmap
+import os
+import re
+from array import array
+from bisect import bisect_right
+from collections.abc import Iterator, Sequence
+from contextlib import contextmanager
+
+# Files smaller than this are simply read into memory; mapping them costs more
+# than it saves.
+MMAP_THRESHOLD = 4 * 1024 * 1024
+
+# a line ending: "\r\n", or a lone "\n" or "\r"
+NEWLINE_PATTERN = re.compile(rb"\r\n?|\n")
+
+
+class MappedLines(Sequence[str]):
+    """
+    A read-only sequence of the lines in a memory-mapped clo file.
+
+    Line boundaries are found on the raw bytes up front, one chunk of about
+    CHUNK_SIZE bytes at a time, and a chunk is only decoded when one of its
+    lines is accessed. The two most recently decoded chunks are kept,
+    which covers the short look-behind `parse_lines` does.
+
+    Lines end at "\r\n", "\n" or a lone "\r", and leading and trailing
+    empty lines are dropped, so the sequence matches what `parse` builds
+    from the decoded text.
+    """
+
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, buffer: mmap.mmap, encoding: str = "utf-8"):
+        self._buffer = buffer
+        self._encoding = encoding
+
+        # chunk k covers bytes offsets[k]:offsets[k + 1] (newline included)
+        # and starts at physical line first_lines[k]
+        size = len(buffer)
+        offsets = array("q", [0])
+        first_lines = array("q", [0])
+        pos = 0
+        while pos < size:
+            # chunks end after a line ending and never split a "\r\n"
+            match = NEWLINE_PATTERN.search(buffer, min(pos + self.CHUNK_SIZE, size) - 1)
+            end = size if match is None else match.end()
+            chunk = buffer[pos:end]
+            newlines = chunk.count(b"\n") + chunk.count(b"\r") - chunk.count(b"\r\n")
+            first_lines.append(first_lines[-1] + newlines)
+            offsets.append(end)
+            pos = end
+        total = first_lines[-1] + 1
+
+        # Trim empty lines at either end, the way str.strip("\n") does.
+        leading = 0
+        pos = 0
+        while True:
+            if buffer[pos : pos + 2] == b"\r\n":
+                pos += 2
+            elif buffer[pos : pos + 1] in (b"\n", b"\r"):
+                pos += 1
+            else:
+                break
+            leading += 1
+        trailing = 0
+        pos = size
+        while pos > 0 and buffer[pos - 1 : pos] in (b"\n", b"\r"):
+            pos -= 2 if buffer[pos - 2 : pos] == b"\r\n" else 1
+            trailing += 1
+
+        self._ends_with_newline = buffer[-1:] in (b"\n", b"\r")
+        self._offsets = offsets
+        self._first_lines = first_lines
+        self._first = min(leading, total - 1)
+        self._count = max(total - leading - trailing, 1)
+        self._chunks: dict[int, list[str]] = {}
+        # (start, stop, lines, offset) for the chunk used last: logical lines
+        # start:stop are lines[index - offset]
+        self._window: tuple[int, int, list[str], int] = (0, 0, [], 0)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index):
+        start, stop, lines, lo = self._window
+        if isinstance(index, int) and start <= index < stop:
+            return lines[index - lo]
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._count))]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("line index out of range")
+        line = self._first + index
+        k = bisect_right(self._first_lines, line) - 1
+        if k == len(self._offsets) - 1:
+            if self._ends_with_newline:
+                # the empty line after a final newline
+                return ""
+            # the last line of a file without a final newline
+            k -= 1
+        lines = self._chunks.get(k)
+        if lines is None:
+            lines = self._decode_chunk(k)
+        # a chunk ending in a newline splits into one more line than it holds
+        held = len(lines)
+        if k < len(self._offsets) - 2 or self._ends_with_newline:
+            held -= 1
+        lo = self._first_lines[k] - self._first
+        self._window = (max(lo, 0), min(lo + held, self._count), lines, lo)
+        return lines[index - lo]
+
+    def _decode_chunk(self, k: int) -> list[str]:
+        text = self._buffer[self._offsets[k] : self._offsets[k + 1]].decode(
+            self._encoding
+        )
+        if "\r" in text:
+            text = text.replace("\r\n", "\n").replace("\r", "\n")
+        lines = text.split("\n")
+        if len(self._chunks) >= 2:
+            del self._chunks[next(iter(self._chunks))]
+        self._chunks[k] = lines
+        return lines
+
+
+@contextmanager
+def open_lines(path: str, encoding: str = "utf-8") -> Iterator[Sequence[str]]:
+    """
+    Opens a clo file and yields its lines, ready to be passed to `parse_lines`.
+
+    Files of at least MMAP_THRESHOLD bytes are memory-mapped and decoded line
+    by line on demand; smaller files are read into memory as usual. The lines
+    are only valid inside the `with` block.
+
+    Args:
+        path (str): Path to the clo file.
+        encoding (str): Text encoding of the file (default: utf-8).
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < max(MMAP_THRESHOLD, 1):
+            text = f.read().decode(encoding)
+            text = text.replace("\r\n", "\n").replace("\r", "\n")
+            yield text.strip("\n").split("\n")
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            yield MappedLines(buffer, encoding=encoding)
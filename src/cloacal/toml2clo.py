@@ -1,7 +1,29 @@
+import re
 import tomllib
+from collections.abc import Iterable, Iterator
+from itertools import chain
 
 from .format import format_dict
 
+# the tokens that change how the following lines are read: strings, comments
+# and brackets
+TOKEN_PATTERN = re.compile(r"\"\"\"|'''|\"(?:[^\"\\\n]|\\.)*\"|'[^'\n]*'|#|[\[\]{}]")
+# a table header whose first key is bare or a quoted key without escapes
+HEADER_PATTERN = re.compile(
+    r"\[\s*(?:([A-Za-z0-9_-]+)|\"([^\"\\\n]*)\"|'([^'\n]*)')\s*[.\]]"
+)
+# lines without any of these cannot open or close brackets or multiline strings
+STATE_PATTERN = re.compile(r"[\[\]{}]|\"\"\"|'''")
+MULTILINE_BASIC_END_PATTERN = re.compile(r'(?:[^"\\]|\\[\s\S]|"(?!""))*"""')
+
+
+class TomlSplitError(ValueError):
+    """The TOML document cannot be converted one table at a time."""
+
+
+def _to_sheet(value):
+    return {k: str(v) if isinstance(v, int) else v for k, v in value.items()}
+
 
 def toml2clo(toml_input: str, max_line_length: int = 44) -> str:
     """
@@ -16,10 +38,155 @@ def toml2clo(toml_input: str, max_line_length: int = 44) -> str:
     """
     data = []
     for _, value in tomllib.loads(toml_input).items():
-        data.append({k: str(v) if isinstance(v, int) else v for k, v in value.items()})
+        data.append(_to_sheet(value))
     # TODO: adjust to support multiple entries
     if len(data) > 1:
         raise NotImplementedError("multiple entries not supported yet.")
     if len(data) == 0:
         return ""
     return format_dict(data[0], max_line_length=max_line_length)
+
+
+def _string_end(line, pos, delimiter):
+    # returns the position after the multiline string closing at or after
+    # pos, or None if it goes on past this line
+    if delimiter == '"""':
+        m = MULTILINE_BASIC_END_PATTERN.match(line, pos)
+        end = m.end() if m else None
+    else:
+        end = line.find("'''", pos)
+        end = None if end < 0 else end + 3
+    if end is not None:
+        # a string can end with up to two quotes right before the closing ones
+        for _ in range(2):
+            if line.startswith(delimiter[0], end):
+                end += 1
+    return end
+
+
+def split_tables(lines: Iterable[str]) -> Iterator[str]:
+    """
+    Splits a TOML document, given as lines, into one TOML document per
+    top-level table, without parsing it. Tables such as [a.b] stay with the
+    top-level table they belong to.
+
+    Only strings, comments and brackets are looked at, to tell table headers
+    from array lines and string contents, so a table is yielded as soon as
+    the header of the next one is read.
+
+    Args:
+        lines (Iterable[str]): The lines of the document, for example a file.
+
+    Raises:
+        TomlSplitError: If the document has keys outside of any table, arrays
+            of tables, or a table continued after another table started.
+    """
+    chunk = []
+    current = None  # the top-level table being read
+    seen = set()
+    multiline = None  # the delimiter of the multiline string being read
+    depth = 0  # open brackets and braces
+
+    for line in lines:
+        stripped = line.lstrip()
+        if multiline is None and depth == 0 and stripped.startswith("["):
+            if stripped.startswith("[["):
+                raise TomlSplitError("arrays of tables cannot be split")
+            m = HEADER_PATTERN.match(stripped)
+            if m:
+                table = next(key for key in m.groups() if key is not None)
+            else:
+                # the header parsed on its own gives the name of its table
+                table = next(iter(tomllib.loads(stripped)))
+            if table != current:
+                if table in seen:
+                    raise TomlSplitError(
+                        f"table {table!r} is continued after another table"
+                    )
+                if current is not None:
+                    yield "".join(chunk)
+                    chunk = []
+                seen.add(table)
+                current = table
+            chunk.append(line)
+            continue
+
+        if current is None and stripped and not stripped.startswith("#"):
+            raise TomlSplitError("keys outside of any table cannot be split")
+
+        if multiline is None and not STATE_PATTERN.search(line):
+            chunk.append(line)
+            continue
+
+        pos = 0
+        while True:
+            if multiline is not None:
+                end = _string_end(line, pos, multiline)
+                if end is None:
+                    break
+                multiline, pos = None, end
+            m = TOKEN_PATTERN.search(line, pos)
+            if m is None or m.group() == "#":
+                break
+            token = m.group()
+            if token in ('"""', "'''"):
+                multiline = token
+            elif token in "[{":
+                depth += 1
+            elif token in "]}":
+                depth -= 1
+            pos = m.end()
+        chunk.append(line)
+
+    if current is not None:
+        yield "".join(chunk)
+
+
+def iter_toml2clo(lines: Iterable[str], max_line_length: int = 44) -> Iterator[str]:
+    """
+    Converts a TOML document with any number of top-level tables to
+    formatted Cloacal sheets, one table at a time.
+
+    The document is read with `split_tables` and every table is parsed and
+    formatted as soon as it has been read, so the first sheet comes out
+    right away and memory use does not grow with the size of the document.
+    If the document cannot be split (see `split_tables`) before any sheet
+    has been yielded, the whole document is parsed at once instead.
+
+    Args:
+        lines (Iterable[str]): The lines of the TOML document.
+        max_line_length (int): Maximum line width for formatting (default: 44).
+
+    Yields:
+        str: One formatted Cloacal sheet per table.
+
+    Raises:
+        TomlSplitError: If the document turns out not to be splittable after
+            some sheets were already yielded.
+    """
+    lines = iter(lines)
+    head = []  # lines read until the first sheet is out, for the fallback
+    recording = True
+
+    def read():
+        for line in lines:
+            if recording:
+                head.append(line)
+            yield line
+
+    tables = split_tables(read())
+    try:
+        first = next(tables, None)
+    except TomlSplitError:
+        data = tomllib.loads("".join(head) + "".join(lines))
+        for value in data.values():
+            yield format_dict(_to_sheet(value), max_line_length=max_line_length)
+        return
+
+    recording = False
+    head.clear()
+    if first is None:
+        return
+    for chunk in chain([first], tables):
+        for value in tomllib.loads(chunk).values():
+            yield format_dict(_to_sheet(value), max_line_length=max_line_length)
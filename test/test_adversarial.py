@@ -0,0 +1,77 @@
+import time
+
+import pytest
+
+from cloacal.parse import Limits, ParseLimitError, parse
+
+# inputs built to make backtracking patterns or repeated scans blow up, as
+# functions of a size
+ADVERSARIAL = {
+    "long word": lambda n: "a" * n,
+    "long word and junk": lambda n: "a" * n + "!",
+    "leading whitespace": lambda n: " " * n + "x",
+    "separators": lambda n: "-" * n,
+    "key and separators": lambda n: "a" + "-" * n + "!",
+    "separators and spaces": lambda n: "a" + " -" * n + "!",
+    "key then whitespace": lambda n: "a -" + " " * n + "!",
+    "whitespace around word": lambda n: " " * n + "a" * n + " " * n + "!",
+    "long value": lambda n: "a -- " + "x " * n,
+    "long block line": lambda n: "d ---\n  " + "x" * n,
+    "long list item": lambda n: "d ---\n  > " + "x " * n,
+    "many headers": lambda n: "d ---\n" * (n // 6),
+    "many list markers": lambda n: "d ---\n" + "  >\n" * (n // 4),
+    "many subtasks": lambda n: "d ---\n  > x\n" + "        > y\n" * (n // 12),
+    "many name boxes": lambda n: "+\n| x |\n+\n" * (n // 10),
+    "many unrecognized lines": lambda n: "d ---\n" + "!\n" * (n // 2),
+}
+
+SIZE = 1_000_000
+# a megabyte of input of any shape parses within this many seconds, a bound
+# loose enough for slow machines; quadratic work on a megabyte takes hours
+TIME_BOUND = 10.0
+
+
+def best_time(text, runs):
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        parse(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+@pytest.mark.parametrize("name", list(ADVERSARIAL))
+def test_adversarial_input_parses_quickly(name):
+    assert best_time(ADVERSARIAL[name](SIZE), runs=2) < TIME_BOUND
+
+
+def test_max_line_length():
+    limits = Limits(max_line_length=10)
+
+    assert parse("age -- 99\nilk - bird", limits=limits)
+    with pytest.raises(ParseLimitError, match="line 2 is 11 characters long"):
+        parse("age -- 99\nilk -- bird", limits=limits)
+    with pytest.raises(ParseLimitError, match="line 3"):
+        parse("d ---\n  > x\n    " + "y" * 20, limits=limits)
+
+
+def test_max_block_lines():
+    limits = Limits(max_block_lines=3)
+
+    assert parse("d ---\n  > x\n  > y\nage -- 1", limits=limits)
+    with pytest.raises(ParseLimitError, match="block 'd' on line 2"):
+        parse("age -- 1\nd ---\n  > x\n  > y\n  > z", limits=limits)
+    with pytest.raises(ParseLimitError, match="block 'd'"):
+        parse("d ---\n  > x\n    y\n    z", limits=limits)
+
+
+def test_max_keys():
+    limits = Limits(max_keys=2)
+
+    assert parse("a -- 1\nb -- 2", limits=limits)
+    with pytest.raises(ParseLimitError, match="limit of 2 keys"):
+        parse("a -- 1\na -- 2\nb ---", limits=limits)
+
+
+def test_limit_error_is_a_value_error():
+    assert issubclass(ParseLimitError, ValueError)
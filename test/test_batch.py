@@ -0,0 +1,71 @@
+import threading
+
+import pytest
+
+from cloacal.batch import format_batch, parse_batch
+from cloacal.format import format_dict, format_str
+from cloacal.parse import parse
+
+
+def text(i):
+    return (
+        f"+--+\n| n{i} |\n+--+\nage -- {i}\n"
+        f"description ----\n  {'word ' * (i % 17)}end {i}\n"
+        f"memories ----\n  > first {i}\n  > second {'x ' * (i % 5)}\n"
+    )
+
+
+TEXTS = [text(i) for i in range(300)]
+
+
+@pytest.mark.parametrize("threads", [1, 4])
+def test_parse_batch_keeps_order(threads):
+    assert list(parse_batch(TEXTS, threads=threads, chunk_size=7)) == [
+        parse(t) for t in TEXTS
+    ]
+
+
+@pytest.mark.parametrize("threads", [1, 4])
+def test_format_batch_keeps_order(threads):
+    sheets = [parse(t) for t in TEXTS]
+    formatted = list(
+        format_batch(sheets, threads=threads, max_line_length=30, chunk_size=5)
+    )
+
+    assert formatted == [format_dict(s, max_line_length=30) for s in sheets]
+    assert list(format_batch(TEXTS, threads=threads)) == [format_str(t) for t in TEXTS]
+
+
+def test_batches_are_released_in_order_with_a_bounded_window():
+    consumed = 0
+
+    def items():
+        nonlocal consumed
+        for t in TEXTS:
+            consumed += 1
+            yield t
+
+    results = format_batch(items(), threads=2, chunk_size=10, window=3)
+    next(results)
+    # the chunk being yielded and at most two more are in flight
+    assert consumed <= 3 * 10
+    assert len(list(results)) == len(TEXTS) - 1
+
+
+def test_format_batch_uses_a_formatter_per_thread(monkeypatch):
+    from cloacal import batch
+
+    seen = {}
+    original = batch._thread_formatter
+
+    def recording(width):
+        formatter = original(width)
+        seen.setdefault(threading.get_ident(), set()).add(id(formatter))
+        return formatter
+
+    monkeypatch.setattr(batch, "_thread_formatter", recording)
+    list(format_batch(TEXTS, threads=4, chunk_size=3))
+
+    formatters = list(seen.values())
+    assert all(len(ids) == 1 for ids in formatters)
+    assert len(set.union(*formatters)) == len(formatters)
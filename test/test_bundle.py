@@ -0,0 +1,237 @@
+import io
+import subprocess
+import sys
+import tarfile
+import zipfile
+
+import pytest
+
+from cloacal.bundle import (
+    BundleError,
+    bundle_kind,
+    iter_members,
+    read_bundle,
+    rewrite_bundle,
+)
+from cloacal.format import format_str
+from cloacal.toml2clo import toml2clo
+
+UGLY = "+--+\n| Carlisle |\n+--+\nilk - bird\nage -- 99\n"
+TOML = '[bob]\nname = "Bob"\nage = 3\n'
+
+
+def make_bundle(path, members):
+    if bundle_kind(path) == "zip":
+        with zipfile.ZipFile(path, "w") as bundle:
+            for name, text in members.items():
+                bundle.writestr(name, text)
+    else:
+        with tarfile.open(path, "w:gz" if str(path).endswith("gz") else "w") as bundle:
+            for name, text in members.items():
+                info = tarfile.TarInfo(name)
+                info.size = len(text.encode())
+                bundle.addfile(info, io.BytesIO(text.encode()))
+
+
+def contents(path):
+    return {member.name: member.data.decode() for member in iter_members(path)}
+
+
+MEMBERS = {"cast/a.clo": UGLY, "notes.txt": "hi", "cast/b.toml": TOML}
+
+
+def test_bundle_kind():
+    assert bundle_kind("cast.tar.gz") == bundle_kind("cast.TGZ") == "tar"
+    assert bundle_kind("cast.zip") == "zip"
+    assert bundle_kind("cast.clo") is None
+    assert bundle_kind("cast.gz") is None
+
+
+@pytest.mark.parametrize("name", ["cast.tar", "cast.tar.gz", "cast.zip"])
+def test_read_bundle(tmp_path, name):
+    path = tmp_path / name
+    make_bundle(path, MEMBERS)
+
+    assert list(read_bundle(path)) == [("cast/a.clo", UGLY)]
+    assert list(read_bundle(path, "*.toml")) == [("cast/b.toml", TOML)]
+    assert [name for name, _ in read_bundle(path, "*")] == list(MEMBERS)
+
+
+@pytest.mark.parametrize("name", ["cast.tar", "cast.zip"])
+def test_member_patterns(tmp_path, name):
+    path = tmp_path / name
+    nested = {
+        "npcs/bob.toml": TOML,
+        "npcs/town/inn/eve.toml": TOML,
+        "pcs/npcs/al.toml": TOML,
+        "npcs/town/notes.txt": "hi",
+    }
+    make_bundle(path, nested)
+
+    def matching(pattern):
+        return [name for name, _ in read_bundle(path, pattern)]
+
+    assert matching("npcs/**/*.toml") == ["npcs/bob.toml", "npcs/town/inn/eve.toml"]
+    assert matching("npcs/*.toml") == ["npcs/bob.toml"]
+    assert matching("**/npcs/*.toml") == ["npcs/bob.toml", "pcs/npcs/al.toml"]
+    assert matching("*.toml") == list(nested)[:3]
+
+    count = rewrite_bundle(
+        path,
+        tmp_path / "out.zip",
+        lambda name, text: (name[:-5] + ".clo", toml2clo(text)),
+        "npcs/**/*.toml",
+    )
+    assert count == 2
+    assert sorted(contents(tmp_path / "out.zip")) == [
+        "npcs/bob.clo",
+        "npcs/town/inn/eve.clo",
+        "npcs/town/notes.txt",
+        "pcs/npcs/al.toml",
+    ]
+
+
+@pytest.mark.parametrize("source", ["cast.tar.gz", "cast.zip"])
+@pytest.mark.parametrize("target", ["out.tar.xz", "out.zip"])
+def test_rewrite_bundle(tmp_path, source, target):
+    make_bundle(tmp_path / source, MEMBERS)
+
+    count = rewrite_bundle(
+        tmp_path / source,
+        tmp_path / target,
+        lambda name, text: (name, format_str(text, 30)),
+    )
+
+    assert count == 1
+    assert contents(tmp_path / target) == dict(
+        MEMBERS, **{"cast/a.clo": format_str(UGLY, 30)}
+    )
+    assert contents(tmp_path / source) == MEMBERS
+
+
+def test_rewrite_bundle_in_place_keeping_members(tmp_path):
+    path = tmp_path / "cast.zip"
+    make_bundle(path, MEMBERS)
+
+    rewrite_bundle(
+        path, path, lambda name, text: ("b.clo", toml2clo(text)), "*.toml", keep=True
+    )
+
+    assert contents(path) == dict(MEMBERS, **{"b.clo": toml2clo(TOML)})
+    assert [p.name for p in tmp_path.iterdir()] == ["cast.zip"]
+
+
+def make_tree_bundle(path):
+    # a directory, a symlink and an executable next to a sheet
+    with tarfile.open(path, "w") as bundle:
+        directory = tarfile.TarInfo("cast")
+        directory.type, directory.mode = tarfile.DIRTYPE, 0o750
+        bundle.addfile(directory)
+        link = tarfile.TarInfo("cast/latest.clo")
+        link.type, link.linkname = tarfile.SYMTYPE, "a.clo"
+        bundle.addfile(link)
+        for name, data, mode in [
+            ("cast/a.clo", UGLY.encode(), 0o640),
+            ("cast/run.sh", b"#!/bin/sh\n", 0o755),
+        ]:
+            info = tarfile.TarInfo(name)
+            info.size, info.mode, info.uname = len(data), mode, "gull"
+            bundle.addfile(info, io.BytesIO(data))
+
+
+def test_rewrite_bundle_keeps_directories_links_and_modes(tmp_path):
+    make_tree_bundle(tmp_path / "cast.tar")
+
+    def convert(name, text):
+        return name, format_str(text)
+
+    rewrite_bundle(tmp_path / "cast.tar", tmp_path / "out.tar.gz", convert)
+    with tarfile.open(tmp_path / "out.tar.gz") as bundle:
+        infos = {info.name: info for info in bundle.getmembers()}
+        assert bundle.extractfile("cast/a.clo").read().decode() == format_str(UGLY)
+    assert list(infos) == ["cast", "cast/latest.clo", "cast/a.clo", "cast/run.sh"]
+    assert infos["cast"].isdir() and infos["cast"].mode == 0o750
+    assert infos["cast/latest.clo"].issym()
+    assert infos["cast/latest.clo"].linkname == "a.clo"
+    assert infos["cast/a.clo"].mode == 0o640 and infos["cast/a.clo"].uname == "gull"
+    assert infos["cast/run.sh"].mode == 0o755
+
+    # to zip, and from that zip back to tar
+    rewrite_bundle(tmp_path / "cast.tar", tmp_path / "out.zip", convert)
+    with zipfile.ZipFile(tmp_path / "out.zip") as bundle:
+        modes = {info.filename: info.external_attr >> 16 for info in bundle.infolist()}
+        assert bundle.read("cast/latest.clo") == b"a.clo"
+    assert modes == {
+        "cast/": 0o40750,
+        "cast/latest.clo": 0o120644,
+        "cast/a.clo": 0o100640,
+        "cast/run.sh": 0o100755,
+    }
+    assert contents(tmp_path / "out.zip") == {
+        "cast/a.clo": format_str(UGLY),
+        "cast/run.sh": "#!/bin/sh\n",
+    }
+
+    rewrite_bundle(tmp_path / "out.zip", tmp_path / "back.tar", convert)
+    with tarfile.open(tmp_path / "back.tar") as bundle:
+        infos = {info.name: info for info in bundle.getmembers()}
+    assert infos["cast"].isdir() and infos["cast"].mode == 0o750
+    assert infos["cast/latest.clo"].linkname == "a.clo"
+    assert infos["cast/run.sh"].mode == 0o755
+
+
+@pytest.mark.parametrize("first", [True, False])
+def test_rewrite_bundle_refuses_duplicate_members(tmp_path, first):
+    path = tmp_path / "cast.zip"
+    existing = {"cast/b.clo": "age -- 1\n"}
+    make_bundle(path, {**existing, **MEMBERS} if first else {**MEMBERS, **existing})
+
+    with pytest.raises(BundleError, match="already holds cast/b.clo"):
+        rewrite_bundle(
+            path,
+            path,
+            lambda name, text: (name.replace(".toml", ".clo"), toml2clo(text)),
+            "*.toml",
+            keep=True,
+        )
+    assert contents(path)["cast/b.clo"] == "age -- 1\n"
+
+
+def test_rewrite_bundle_errors(tmp_path):
+    make_bundle(tmp_path / "cast.tar", MEMBERS)
+    (tmp_path / "broken.zip").write_text("not a zip")
+
+    with pytest.raises(BundleError):
+        rewrite_bundle(tmp_path / "cast.tar", tmp_path / "out.clo", lambda *m: m)
+    with pytest.raises(BundleError):
+        rewrite_bundle(tmp_path / "broken.zip", tmp_path / "out.zip", lambda *m: m)
+    with pytest.raises(ZeroDivisionError):
+        rewrite_bundle(tmp_path / "cast.tar", tmp_path / "out.zip", lambda *m: 1 / 0)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["broken.zip", "cast.tar"]
+
+
+def test_cli_format_and_toml_bundles(tmp_path):
+    def cloacal(*args):
+        return subprocess.run(
+            [sys.executable, "-m", "cloacal", *args],
+            cwd=tmp_path,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+
+    make_bundle(tmp_path / "cast.tar.gz", MEMBERS)
+
+    printed = cloacal("format", "-f", "cast.tar.gz").stdout
+    assert printed == f"==> cast.tar.gz:cast/a.clo <==\n{format_str(UGLY)}\n"
+
+    cloacal("format", "-f", "cast.tar.gz", "--width", "30", "-o", "out.zip")
+    assert contents(tmp_path / "out.zip")["cast/a.clo"] == format_str(UGLY, 30)
+
+    cloacal("toml", "-f", "cast.tar.gz", "-o")
+    assert contents(tmp_path / "cast.tar.gz") == dict(
+        MEMBERS, **{"cast/b.clo": toml2clo(TOML)}
+    )
+
+    printed = cloacal("toml", "-f", "out.zip", "--members", "cast/*.toml").stdout
+    assert printed == f"==> out.zip:cast/b.clo <==\n{toml2clo(TOML)}\n"
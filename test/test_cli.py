@@ -0,0 +1,126 @@
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from cloacal.format import format_str
+from cloacal.pack import pack
+
+EXAMPLE = Path(__file__).parent.parent / "example.clo"
+
+# how much slower than a bare interpreter `cloacal format` may start when
+# formatting stdin, in seconds; about 10 ms is spent importing and formatting
+STARTUP_BUDGET = 0.025
+
+
+def run(*args, **kwargs):
+    return subprocess.run(
+        [sys.executable, *args],
+        capture_output=True,
+        text=True,
+        check=True,
+        **kwargs,
+    )
+
+
+def fastest(args, runs=5):
+    # bytecode is written on the first run, as in an installed package
+    env = {k: v for k, v in os.environ.items() if k != "PYTHONDONTWRITEBYTECODE"}
+    best = float("inf")
+    for _ in range(runs):
+        with open(EXAMPLE) as stdin:
+            start = time.perf_counter()
+            run(*args, stdin=stdin, env=env)
+            best = min(best, time.perf_counter() - start)
+    return best
+
+
+def test_format_stdin_fast_path_skips_click():
+    script = (
+        "import sys\n"
+        "sys.argv = ['cloacal', 'format', '--width', '30']\n"
+        "from cloacal.__main__ import main\n"
+        "main()\n"
+        "assert 'click' not in sys.modules\n"
+        "assert 'tomllib' not in sys.modules\n"
+        "for module in ('batch', 'columns', 'corpus', 'document', 'pack'):\n"
+        "    assert f'cloacal.{module}' not in sys.modules\n"
+    )
+    result = run("-c", script, input=EXAMPLE.read_text())
+
+    assert result.stdout == format_str(EXAMPLE.read_text(), 30) + "\n"
+
+
+def test_format_stdin_matches_click_command():
+    fast = run("-m", "cloacal", "format", input=EXAMPLE.read_text())
+    full = run("-m", "cloacal", "format", "-f", str(EXAMPLE))
+
+    assert fast.stdout == full.stdout
+
+
+def test_format_stdin_cold_start_budget():
+    bare = fastest(["-c", "pass"])
+    cloacal = fastest(["-m", "cloacal", "format"])
+
+    assert cloacal - bare < STARTUP_BUDGET
+
+
+def test_format_lines_only_formats_the_range():
+    ugly = "age -- 99\ndescription ----\n  Id ipsum elit tempor non incididunt\nilk - bird\n"
+    result = run("-m", "cloacal", "format", "--lines", "2:2", input=ugly)
+
+    assert result.stdout == (
+        "age -- 99\n"
+        "description -------------------------------\n"
+        "  Id ipsum elit tempor non incididunt\n"
+        "\n"
+        "ilk - bird\n"
+    )
+
+
+def test_format_several_widths(tmp_path):
+    output = tmp_path / "character.clo"
+    run(
+        "-m",
+        "cloacal",
+        "format",
+        "-f",
+        str(EXAMPLE),
+        "--width",
+        "44,72",
+        "-o",
+        str(output),
+    )
+
+    text = EXAMPLE.read_text()
+    assert (tmp_path / "character.44.clo").read_text() == format_str(text, 44)
+    assert (tmp_path / "character.72.clo").read_text() == format_str(text, 72)
+
+    result = run("-m", "cloacal", "format", "--width", "30,50", input=text)
+    assert result.stdout == (
+        "==> stdin (width 30) <==\n"
+        + format_str(text, 30)
+        + "\n==> stdin (width 50) <==\n"
+        + format_str(text, 50)
+        + "\n"
+    )
+
+
+def test_format_several_widths_rejects_other_modes(tmp_path):
+    archive = tmp_path / "cast.clopack"
+    pack([str(EXAMPLE)], str(archive))
+    for args in (
+        ["--daemon"],
+        ["--lines", "1:2"],
+        ["-f", str(archive)],
+    ):
+        result = subprocess.run(
+            [sys.executable, "-m", "cloacal", "format", "--width", "44,72", *args],
+            input=EXAMPLE.read_text(),
+            capture_output=True,
+            text=True,
+            check=False,
+        )
+        assert result.returncode == 2
+        assert "single --width" in result.stderr
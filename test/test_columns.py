@@ -0,0 +1,140 @@
+import pytest
+
+from cloacal.columns import CategoricalColumn, Columns, NumericColumn
+from cloacal.corpus import Corpus
+
+SHEETS = [
+    {"name": "Carlisle", "age": "99", "species": "seagull", "ilk": "bird"},
+    {"name": "Evelyn", "age": "28", "species": "fox", "ilk": "clever"},
+    {"name": "Anonymous", "species": "human"},
+    {
+        "name": "Mysterious",
+        "age": "40",
+        "species": "seagull",
+        "ilk": "a much longer block of text than a simple pair holds",
+        "memories": ["First encounter."],
+    },
+    {"name": "Weight", "age": "12", "species": "fox", "weight": "3.5"},
+]
+
+
+@pytest.fixture
+def columns():
+    return Columns.from_sheets(SHEETS)
+
+
+def test_column_types(columns):
+    assert sorted(columns.keys()) == ["age", "ilk", "name", "species", "weight"]
+    assert isinstance(columns["age"], NumericColumn)
+    assert columns["age"].values.typecode == "q"
+    assert columns["weight"].values.typecode == "d"
+    assert isinstance(columns["species"], CategoricalColumn)
+    assert columns["species"].categories == ["seagull", "fox", "human"]
+    assert [columns["age"][row] for row in range(5)] == [99, 28, None, 40, 12]
+    # block values are not part of any column
+    assert [columns["ilk"][row] for row in range(5)] == [
+        "bird",
+        "clever",
+        None,
+        None,
+        None,
+    ]
+
+
+def test_where(columns):
+    assert columns.where("age", ">=", 30).rows() == [0, 3]
+    assert columns.where("age", "<", "30").rows() == [1, 4]
+    assert columns.where("species", "==", "fox").rows() == [1, 4]
+    assert columns.where("species", "!=", "fox").rows() == [0, 2, 3]
+    assert columns.where("missing", "==", "x").count() == 0
+
+    seagulls = columns.where("species", "==", "seagull")
+    old = columns.where("age", ">", 50)
+    assert (seagulls & old).rows() == [0]
+    assert (seagulls | old).rows() == [0, 3]
+    assert (~seagulls).rows() == [1, 2, 4]
+
+
+def test_count(columns):
+    assert columns.count("species") == {"seagull": 2, "fox": 2, "human": 1}
+    assert columns.count("species", where=columns.where("age", "<", 50)) == {
+        "fox": 2,
+        "seagull": 1,
+    }
+    assert columns.count("age", where=columns.where("species", "==", "fox")) == {
+        28: 1,
+        12: 1,
+    }
+
+
+def test_group_by(columns):
+    assert columns.group_by("species") == columns.count("species")
+    assert columns.group_by("species", of="age", agg="mean") == {
+        "seagull": 69.5,
+        "fox": 20,
+    }
+    assert columns.group_by("species", of="age", agg="max") == {
+        "seagull": 99,
+        "fox": 28,
+    }
+    assert columns.group_by(
+        "species", of="age", agg="sum", where=columns.where("age", "<", 90)
+    ) == {"seagull": 40, "fox": 40}
+    with pytest.raises(TypeError):
+        columns.group_by("age", of="species", agg="sum")
+    with pytest.raises(ValueError):
+        columns.group_by("species", of="age", agg="median")
+
+
+def test_many_categories():
+    columns = Columns.from_sheets({"name": f"Sheet {i}"} for i in range(300))
+
+    assert columns["name"].codes.typecode == "l"
+    assert columns.where("name", "==", "Sheet 299").rows() == [299]
+
+
+def test_from_corpus_sheets():
+    corpus = Corpus()
+    for data in SHEETS:
+        corpus.add(data)
+
+    assert Columns.from_sheets(corpus).count("species") == Columns.from_sheets(
+        SHEETS
+    ).count("species")
+
+
+def test_to_numpy(columns):
+    numpy = pytest.importorskip("numpy")
+
+    ages = columns.to_numpy("age")
+    assert ages.dtype == numpy.int64
+    assert ages.tolist() == [99, 28, None, 40, 12]
+    assert columns.to_numpy("species").tolist() == [
+        "seagull",
+        "fox",
+        "human",
+        "seagull",
+        "fox",
+    ]
+
+
+def test_group_by_many_categories():
+    sheets = [{"home": f"town {i % 300}", "age": str(i)} for i in range(1200)]
+    columns = Columns.from_sheets(sheets)
+    expected = {}
+    for data in sheets:
+        expected.setdefault(data["home"], []).append(int(data["age"]))
+
+    assert columns.group_by("home", of="age", agg="sum") == {
+        home: sum(ages) for home, ages in expected.items()
+    }
+    assert columns.group_by(
+        "age", of="age", agg="max", where=columns.where("age", "<", 3)
+    ) == {0: 0, 1: 1, 2: 2}
+
+
+def test_non_finite_words_are_not_numbers():
+    columns = Columns.from_sheets([{"mood": "nan"}, {"mood": "inf"}, {"mood": "1"}])
+
+    assert isinstance(columns["mood"], CategoricalColumn)
+    assert columns.count("mood") == {"nan": 1, "inf": 1, "1": 1}
@@ -0,0 +1,70 @@
+from collections import OrderedDict
+
+from cloacal.corpus import Corpus, deep_sizeof, load_corpus
+from cloacal.format import Formatter, format_dict
+from cloacal.parse import parse
+
+SPECIES = ["seagull", "fox", "human"]
+
+SHEETS = [
+    OrderedDict(
+        {
+            "name": f"Character {i}",
+            "age": str(20 + i % 7),
+            "species": SPECIES[i % 3],
+            "description": f"Character {i} has a long and winding backstory to tell.",
+            "memories": ["Consectetur ut qui Lorem ad.", f"Memory number {i}."],
+        }
+    )
+    for i in range(300)
+]
+
+
+def test_sheets_round_trip():
+    corpus = Corpus()
+    for data in SHEETS:
+        corpus.add(data)
+
+    assert len(corpus) == len(SHEETS)
+    assert [sheet.to_dict() for sheet in corpus] == SHEETS
+    sheet = corpus[5]
+    assert list(sheet) == list(SHEETS[5])
+    assert sheet["species"] == SHEETS[5]["species"]
+    assert sheet["memories"] == tuple(SHEETS[5]["memories"])
+    assert format_dict(sheet) == format_dict(SHEETS[5])
+
+
+def test_keys_and_short_values_are_shared():
+    corpus = Corpus()
+    first = corpus.add(parse(format_dict(SHEETS[0])))
+    second = corpus.add(parse(format_dict(SHEETS[3])))
+
+    assert first._layout is second._layout
+    assert first["species"] is second["species"]
+    # long block text is not interned
+    assert (
+        corpus.add(parse(format_dict(SHEETS[0])))["description"]
+        is not (first["description"])
+    )
+
+
+def test_memory_per_sheet_is_smaller_than_ordered_dicts():
+    parsed = [parse(format_dict(data)) for data in SHEETS]
+    corpus = Corpus()
+    for data in parsed:
+        corpus.add(data)
+
+    per_dict = deep_sizeof([parsed]) / len(parsed)
+    assert corpus.memory_per_sheet() < per_dict / 2
+
+
+def test_load_corpus(tmp_path):
+    path = tmp_path / "roster.clo"
+    with open(path, "w") as f:
+        Formatter().format_many(SHEETS[:10], out=f)
+
+    corpus = load_corpus([str(path)])
+
+    assert [sheet.to_dict() for sheet in corpus] == [
+        parse(format_dict(data)) for data in SHEETS[:10]
+    ]
@@ -0,0 +1,256 @@
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from cloacal import daemon
+from cloacal.daemon import DaemonError, Server, default_socket_path, request
+from cloacal.format import format_range, format_str
+from cloacal.parse import parse
+
+UGLY = """
++--+
+| Carlisle |
++-----
+age -- 99
+species - seagull
+description ----
+     Id ipsum elit tempor non incididunt laborum anim dolore eu fugiat.
+"""
+
+
+@pytest.fixture
+def socket_path(tmp_path):
+    path = str(tmp_path / "cloacal.sock")
+    server = Server(path, workers=2)
+    thread = threading.Thread(
+        target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True
+    )
+    thread.start()
+    yield path
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def test_format(socket_path):
+    result = request("format", path=socket_path, text=UGLY, width=30)
+
+    assert result == format_str(UGLY, max_line_length=30)
+
+
+def test_check(socket_path):
+    formatted = format_str(UGLY)
+
+    assert request("check", path=socket_path, text=formatted + "\n") is True
+    assert request("check", path=socket_path, text=UGLY) is False
+
+
+def test_parse_keeps_key_order(socket_path):
+    result = request("parse", path=socket_path, text=UGLY)
+
+    assert list(result.items()) == list(parse(UGLY).items())
+
+
+def test_errors(socket_path):
+    with pytest.raises(DaemonError, match="unknown method"):
+        request("reformat", path=socket_path, text=UGLY)
+    with pytest.raises(DaemonError, match="TypeError"):
+        request("format", path=socket_path, txt=UGLY)
+
+
+def test_many_requests_on_one_connection(socket_path):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        with sock.makefile("rwb") as f:
+            for i in range(3):
+                message = {"id": i, "method": "check", "params": {"text": UGLY}}
+                f.write(json.dumps(message).encode() + b"\n")
+                f.flush()
+                assert json.loads(f.readline()) == {"id": i, "result": False}
+            f.write(b"not json\n")
+            f.flush()
+            assert "invalid request" in json.loads(f.readline())["error"]
+
+
+def test_concurrent_clients(socket_path):
+    texts = [UGLY.replace("99", str(age)) for age in range(20)]
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(
+            pool.map(lambda text: request("format", path=socket_path, text=text), texts)
+        )
+
+    assert results == [format_str(text) for text in texts]
+
+
+def test_idle_connections_do_not_block_new_clients(socket_path):
+    # more idle connections than the two workers of the fixture's server
+    idle = [socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) for _ in range(4)]
+    try:
+        for sock in idle:
+            sock.connect(socket_path)
+        assert request("format", path=socket_path, timeout=2, text=UGLY) == format_str(
+            UGLY
+        )
+    finally:
+        for sock in idle:
+            sock.close()
+
+
+def test_idle_and_open_connections_are_closed(tmp_path, monkeypatch):
+    monkeypatch.setattr(daemon._Handler, "timeout", 0.1)
+    path = str(tmp_path / "cloacal.sock")
+    server = Server(path)
+    thread = threading.Thread(
+        target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True
+    )
+    thread.start()
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(2)
+        sock.connect(path)
+        assert sock.recv(1) == b""
+
+    monkeypatch.setattr(daemon._Handler, "timeout", None)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(2)
+        sock.connect(path)
+        sock.sendall(b'{"method": "check", "params": {"text": ""}}\n')
+        assert sock.recv(65536)
+        server.shutdown()
+        server.server_close()
+        thread.join()
+        assert sock.recv(1) == b""
+
+
+def test_serve_stops_on_sigterm_with_a_client_connected(tmp_path):
+    path = str(tmp_path / "cloacal.sock")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "cloacal", "serve", "--socket", path],
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.monotonic() + 5
+        while not os.path.exists(path) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(path)
+            sock.sendall(b'{"method": "check", "params": {"text": ""}}\n')
+            assert sock.recv(65536)
+            process.send_signal(signal.SIGTERM)
+            assert process.wait(timeout=3) == 0
+        assert not os.path.exists(path)
+    finally:
+        process.kill()
+        process.wait()
+
+
+def test_stale_socket_is_replaced(tmp_path):
+    path = str(tmp_path / "stale.sock")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.bind(path)
+
+    server = Server(path)
+    server.server_close()
+
+    assert not os.path.exists(path)
+
+
+def test_request_without_daemon(tmp_path):
+    with pytest.raises(OSError):
+        request("format", path=str(tmp_path / "missing.sock"), text=UGLY)
+
+
+@pytest.mark.parametrize(
+    "args", [["format", "--daemon"], ["format", "--daemon", "--width", "30"]]
+)
+def test_format_daemon_flag(socket_path, tmp_path, args):
+    width = int(args[-1]) if "--width" in args else 44
+    expected = format_str(UGLY, max_line_length=width) + "\n"
+    for env in [{"CLOACAL_SOCKET": socket_path}, {"CLOACAL_SOCKET": "/nonexistent"}]:
+        result = subprocess.run(
+            [sys.executable, "-m", "cloacal", *args],
+            input=UGLY,
+            capture_output=True,
+            text=True,
+            check=True,
+            env={**os.environ, **env},
+        )
+        assert result.stdout == expected
+
+    sheet = tmp_path / "sheet.clo"
+    sheet.write_text(UGLY)
+    result = subprocess.run(
+        [sys.executable, "-m", "cloacal", *args, "-f", str(sheet)],
+        capture_output=True,
+        text=True,
+        check=True,
+        env={**os.environ, "CLOACAL_SOCKET": socket_path},
+    )
+    assert result.stdout == expected
+
+
+def test_format_range(socket_path):
+    result = request("format_range", path=socket_path, text=UGLY, start=0, end=1)
+
+    assert result == [list(edit) for edit in format_range(UGLY, 0, 1)]
+
+
+def test_default_socket_is_in_a_private_directory(monkeypatch, tmp_path):
+    monkeypatch.delenv("CLOACAL_SOCKET", raising=False)
+    monkeypatch.delenv("XDG_RUNTIME_DIR", raising=False)
+    monkeypatch.setenv("TMPDIR", str(tmp_path))
+    import tempfile
+
+    monkeypatch.setattr(tempfile, "tempdir", None)
+    path = default_socket_path()
+
+    assert path == str(tmp_path / f"cloacal-{os.getuid()}" / "cloacal.sock")
+    Server(path).server_close()
+    assert os.stat(os.path.dirname(path)).st_mode & 0o777 == 0o700
+
+
+def test_sockets_of_other_users_are_not_used(socket_path, monkeypatch, tmp_path):
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    shared.chmod(0o777)
+    with pytest.raises(PermissionError):
+        Server(str(shared / "cloacal.sock"))
+
+    monkeypatch.setattr(os, "getuid", lambda: os.stat(socket_path).st_uid + 1)
+    with pytest.raises(PermissionError):
+        request("format", path=socket_path, text=UGLY)
+
+
+def test_format_daemon_falls_back_on_a_bad_answer(tmp_path):
+    path = str(tmp_path / "bad.sock")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        server.bind(path)
+        server.listen()
+
+        def answer():
+            connection, _ = server.accept()
+            with connection:
+                connection.recv(65536)
+                connection.sendall(b'{"id": 1, "res')
+
+        thread = threading.Thread(target=answer)
+        thread.start()
+        result = subprocess.run(
+            [sys.executable, "-m", "cloacal", "format", "--daemon"],
+            input=UGLY,
+            capture_output=True,
+            text=True,
+            check=True,
+            env={**os.environ, "CLOACAL_SOCKET": path},
+        )
+        thread.join()
+
+    assert result.stdout == format_str(UGLY) + "\n"
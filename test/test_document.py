@@ -0,0 +1,150 @@
+import random
+import time
+
+import pytest
+
+from cloacal.document import ParsedDocument
+from cloacal.format import format_dict
+from cloacal.parse import parse, parse_entries
+
+LINES = [
+    "",
+    "+--------+",
+    "| Carlisle |",
+    "+--------+",
+    "age -- 99",
+    "species - seagull",
+    "name -- Other",
+    "description ----",
+    "  Id ipsum elit tempor non incididunt laborum",
+    "anim dolore eu fugiat.",
+    "memories ----",
+    "  > Consectetur ut qui Lorem ad.",
+    "  >  Veniam mollit nostrud velit laborum",
+    "     veniam irure ut aute magna labore aliqua.",
+    "    > a subtask",
+    "notes ~~~",
+    "age ---- 12",
+    "  just text",
+    "unrecognized line",
+    "empty ---",
+    "  >",
+    "> top",
+    "+--+",
+    "| Bob |",
+    "",
+    "    ",
+]
+
+
+def random_document(rng, size):
+    return "\n".join(rng.choice(LINES) for _ in range(size))
+
+
+def assert_matches_full_parse(document):
+    assert document.data == parse(document.text)
+    assert list(document.data) == list(parse(document.text))
+    assert document.entries() == list(parse_entries(document.lines))
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_random_edits_match_full_parse(seed):
+    rng = random.Random(seed)
+    document = ParsedDocument(random_document(rng, rng.randint(0, 60)))
+    assert_matches_full_parse(document)
+
+    for _ in range(30):
+        start = rng.randint(0, len(document.lines))
+        end = min(start + rng.randint(0, 4), len(document.lines))
+        new_text = "\n".join(rng.choice(LINES) for _ in range(rng.randint(0, 4)))
+        document.apply_edit(start, end, new_text)
+        assert_matches_full_parse(document)
+
+
+def test_new_text_lines():
+    document = ParsedDocument("age -- 1\nilk -- bird")
+
+    document.apply_edit(1, 1, "\n")
+    assert document.lines == ["age -- 1", "", "ilk -- bird"]
+    document.apply_edit(1, 2, "")
+    assert document.lines == ["age -- 1", "ilk -- bird"]
+    with pytest.raises(IndexError):
+        document.apply_edit(2, 3, "x")
+
+
+def sheet(i):
+    return format_dict(
+        {
+            f"age{i}": str(i),
+            f"description{i}": "Id ipsum elit tempor non incididunt laborum anim.",
+            f"memories{i}": ["Consectetur ut qui Lorem ad.", "Veniam mollit."],
+        }
+    )
+
+
+def time_edit(sections, new_lines=1):
+    document = ParsedDocument("\n\n".join(sheet(i) for i in range(sections)))
+    header = f"description{sections // 2} "
+    line = next(i for i, text in enumerate(document.lines) if text.startswith(header))
+    line += 1
+    best = float("inf")
+    for word in ["Lorem", "Ipsum"] * 5:
+        # the edit replaces the line with new_lines lines, moving the rest of
+        # the document when that is more than one
+        start = time.perf_counter()
+        text = "\n".join([f"  {word} ipsum elit."] * new_lines)
+        reparsed = document.apply_edit(line, line + 1, text)
+        best = min(best, time.perf_counter() - start)
+    assert document.data == parse(document.text)
+    return best, len(reparsed)
+
+
+def test_edit_value_in_place():
+    document = ParsedDocument("\n\n".join(sheet(i) for i in range(30)))
+    data = document.data
+    line = document.lines.index("age5 --- 5")
+
+    reparsed = document.apply_edit(line, line + 1, "age5 --- 500\n")
+
+    assert document.data is data
+    assert document.data["age5"] == "500"
+    assert document.data == parse(document.text)
+    assert len(reparsed) < 20
+
+
+def test_edit_cost_does_not_grow_with_document_length():
+    for new_lines in (1, 2):
+        small_time, small_reparsed = time_edit(20, new_lines)
+        large_time, large_reparsed = time_edit(4000, new_lines)
+
+        assert large_reparsed == small_reparsed
+        assert large_time < small_time * 5 + 0.001
+
+
+def test_inserting_lines_does_not_move_every_later_entry():
+    document = ParsedDocument("\n\n".join(sheet(i) for i in range(2000)))
+    line = document.lines.index("age5 --- 5") + 2
+    stored = list(document._starts)
+
+    document.apply_edit(line, line, "  Lorem ipsum elit.\n  Lorem ipsum elit.\n")
+    document.apply_edit(line + 1, line + 2, "")
+
+    assert len(document._starts) == len(stored)
+    assert sum(a != b for a, b in zip(stored, document._starts)) < 20
+    assert document.entries() == ParsedDocument(document.text).entries()
+
+
+def test_edits_at_the_top_reparse_the_lookback_of_later_blocks():
+    pairs = "age -- 1\n" * 8
+    document = ParsedDocument(pairs + "d ---\n  > x\ne ---\n" + pairs)
+    assert document.data["e"] == []
+
+    # e is now among the first ten lines, where empty blocks see no markers
+    document.apply_edit(0, 8, "")
+    assert document.data["e"] == ""
+    assert_matches_full_parse(document)
+    document.apply_edit(0, 0, "\n\n\n")
+    assert_matches_full_parse(document)
+    document.apply_edit(3, 3, pairs)
+    assert document.data["e"] == []
+    assert_matches_full_parse(document)
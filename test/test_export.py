@@ -0,0 +1,141 @@
+import io
+import json
+import subprocess
+import sys
+import tomllib
+
+import pytest
+
+from cloacal.export import export, parse_ordered, write_toml
+from cloacal.format import Formatter, format_dict
+from cloacal.parse import parse_sheets, split_sheets
+from cloacal.toml2clo import toml2clo
+
+SHEETS = [
+    {
+        "name": f"Character {i}",
+        "age": str(i),
+        "species": "seagull",
+        "description": "Id ipsum elit tempor non incididunt laborum anim dolore.",
+        "memories": ["Consectetur ut qui Lorem ad.", f"Memory number {i}."],
+    }
+    for i in range(1, 8)
+]
+
+
+@pytest.fixture
+def roster(tmp_path):
+    path = tmp_path / "roster.clo"
+    with open(path, "w") as f:
+        Formatter().format_many(SHEETS, out=f)
+    return path
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_export_jsonl_keeps_sheet_and_key_order(roster, jobs):
+    out = io.StringIO()
+    export([str(roster)], out, jobs=jobs, window=2)
+
+    rows = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert rows == parse_sheets(roster.read_text())
+    assert [list(row) for row in rows] == [
+        list(data) for data in parse_sheets(roster.read_text())
+    ]
+    assert [row["name"] for row in rows] == [data["name"] for data in SHEETS]
+
+
+def test_export_glob(tmp_path, roster):
+    other = tmp_path / "other.clo"
+    other.write_text(format_dict({"name": "Solo", "age": "3"}))
+
+    out = io.StringIO()
+    export([str(tmp_path / "*.clo")], out)
+
+    names = [json.loads(line)["name"] for line in out.getvalue().splitlines()]
+    assert names == ["Solo"] + [data["name"] for data in SHEETS]
+
+
+def test_export_toml_round_trips_through_toml2clo(roster):
+    out = io.StringIO()
+    export([str(roster)], out, to="toml")
+
+    tables = tomllib.loads(out.getvalue())
+    assert list(tables) == [data["name"] for data in SHEETS]
+    for table in tables.values():
+        single = io.StringIO()
+        write_toml([table], single)
+        assert toml2clo(single.getvalue()) == format_dict(table)
+
+
+def test_write_toml_table_names():
+    out = io.StringIO()
+    write_toml(
+        [{"age": "1"}, {"name": "Twin"}, {"name": "Twin", "odd key": 'a "b"\x7f'}],
+        out,
+    )
+
+    tables = tomllib.loads(out.getvalue())
+    assert tables == {
+        "sheet1": {"age": "1"},
+        "Twin": {"name": "Twin"},
+        "Twin_3": {"name": "Twin", "odd key": 'a "b"\x7f'},
+    }
+
+
+def test_write_toml_numbered_names_never_collide():
+    out = io.StringIO()
+    names = ["Bob_3", "Bob", "Bob", "Bob_4", "Bob", "sheet7", ""]
+    write_toml([{"name": name} for name in names], out)
+
+    tables = tomllib.loads(out.getvalue())
+    assert list(tables) == [
+        "Bob_3",
+        "Bob",
+        "Bob_4",
+        "Bob_4_4",
+        "Bob_5",
+        "sheet7",
+        "sheet7_7",
+    ]
+
+
+def test_parse_ordered_bounded_window():
+    consumed = 0
+
+    def lines():
+        nonlocal consumed
+        for data in SHEETS * 10:
+            consumed += 1
+            yield format_dict(data).split("\n")
+
+    sheets = parse_ordered(lines(), jobs=2, window=2, batch=3)
+    first = next(sheets)
+
+    assert first["name"] == SHEETS[0]["name"]
+    assert consumed <= 2 * 3 + 3
+    assert len(list(sheets)) == len(SHEETS) * 10 - 1
+
+
+def test_export_unknown_format(roster):
+    with pytest.raises(ValueError):
+        export([str(roster)], io.StringIO(), to="yaml")
+
+
+def test_split_sheets_without_name_boxes():
+    lines = ["", "age -- 1", "  +--", "  | not a box", ""]
+
+    assert list(split_sheets(lines)) == [["age -- 1", "  +--", "  | not a box"]]
+
+
+def test_cli_export_reports_missing_files(tmp_path):
+    result = subprocess.run(
+        [sys.executable, "-m", "cloacal", "export", "-f", "nothing/*.clo"],
+        cwd=tmp_path,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+
+    assert result.returncode == 2
+    assert "No files found matching pattern: nothing/*.clo" in result.stderr
+    assert "Traceback" not in result.stderr
@@ -1,4 +1,21 @@
-from cloacal.format import format_str
+import io
+import textwrap
+
+from cloacal.document import ParsedDocument
+from cloacal.format import (
+    WRAP_CACHE_SIZE,
+    Formatter,
+    _wrap_uncached,
+    apply_edits,
+    format_dict,
+    format_range,
+    format_str,
+    format_widths,
+    set_wrap_cache_size,
+    wrap_cache_clear,
+    wrap_cache_info,
+)
+from cloacal.parse import parse
 
 
 def test_format_basic_input():
@@ -217,3 +234,239 @@ notes -------------------------------------
 
     formatted_output = format_str(ugly_input)
     assert formatted_output == expected_output
+
+
+def test_formatter_format_many():
+    sheets = [
+        parse("+--+\n| Solo |\n+--+\nage -- 30"),
+        parse("species - human\nilk -- clever"),
+        parse(""),
+    ]
+    formatter = Formatter(max_line_length=30)
+
+    expected = [format_dict(data, max_line_length=30) for data in sheets]
+    assert formatter.format_many(sheets) == expected
+
+    out = io.StringIO()
+    assert formatter.format_many(iter(sheets), out=out) is None
+    assert out.getvalue() == "\n\n".join(expected) + "\n"
+
+
+class RecordingStream:
+    def __init__(self):
+        self.writes = []
+
+    def write(self, text):
+        self.writes.append(text)
+
+
+def test_formatter_write_streams_lines():
+    data = parse(
+        """
+    +--+
+    | Carlisle |
+    +-----
+
+    age -- 99
+
+    memories -----------------------
+      > Consectetur ut qui Lorem ad.
+      > Veniam mollit nostrud velit laborum laborum veniam irure ut aute magna labore aliqua.
+    """
+    )
+    stream = RecordingStream()
+
+    Formatter().write(data, stream)
+
+    assert "".join(stream.writes) == format_dict(data)
+    assert max(map(len, stream.writes)) <= 44
+
+
+FORMATTED = format_str(
+    """
++--+
+| Carlisle |
++--+
+age -- 99
+species - seagull
+description ----
+  Id ipsum elit tempor non incididunt laborum anim dolore eu fugiat.
+memories ----
+  > Consectetur ut qui Lorem ad.
+  > Veniam mollit nostrud velit laborum laborum veniam irure ut aute.
+notes ----
+  Dolor consectetur aute occaecat.
+"""
+)
+
+
+def test_format_range_leaves_formatted_text_alone():
+    lines = FORMATTED.split("\n")
+    for start in range(len(lines) + 1):
+        assert format_range(FORMATTED, start, len(lines)) == []
+        assert format_range(FORMATTED, 0, start) == []
+
+
+def test_format_range_only_touches_overlapping_entries():
+    ugly = FORMATTED.replace("age ------- 99", "age - 99").replace(
+        "  > Consectetur ut qui Lorem ad.\n  > Veniam mollit nostrud velit laborum\n",
+        "  >    Consectetur ut qui Lorem ad.\n  >  Veniam mollit nostrud velit\n  laborum ",
+    )
+    lines = ugly.split("\n")
+    memories = lines.index("memories ----------------------------------")
+
+    # only the memories block, which holds the range, is reformatted
+    edits = format_range(ugly, memories + 2, memories + 3)
+    assert [(start, end) for start, end, _ in edits] == [(memories + 1, memories + 4)]
+    assert apply_edits(ugly, edits) == FORMATTED.replace("age ------- 99", "age - 99")
+
+    edits = format_range(ugly, 0, len(lines))
+    assert len(edits) == 2
+    assert apply_edits(ugly, edits) == FORMATTED
+
+
+def test_format_range_keeps_entries_in_place():
+    text = "notes ----\n  Id ipsum elit tempor non incididunt\nzebra -- 1\nage -- 2\n"
+    edits = format_range(text, 0, 4)
+    assert apply_edits(text, edits) == (
+        "notes -------------------------------------\n"
+        "  Id ipsum elit tempor non incididunt\n"
+        "\n"
+        "zebra --- 1\n"
+        "age ----- 2\n"
+    )
+    assert edits == format_range(ParsedDocument(text), 0, 4)
+
+
+def test_wrap_cache_is_shared_across_sheets():
+    paragraph = "Dolor consectetur aute occaecat. Ex do reprehenderit nulla sunt."
+    sheets = [
+        {"name": str(i), "description": paragraph, "memories": [paragraph]}
+        for i in range(10)
+    ]
+    wrap_cache_clear()
+    outputs = [format_dict(data) for data in sheets]
+
+    info = wrap_cache_info()
+    # one wrap for the block text and one for the list item width
+    assert (info.misses, info.hits, info.currsize) == (2, 18, 2)
+    assert info.hit_rate == 0.9
+
+    try:
+        set_wrap_cache_size(1)
+        assert [format_dict(data) for data in sheets] == outputs
+        assert wrap_cache_info().currsize == 1
+        set_wrap_cache_size(0)
+        assert [format_dict(data) for data in sheets] == outputs
+        assert wrap_cache_info().hits == 0
+    finally:
+        set_wrap_cache_size(WRAP_CACHE_SIZE)
+
+
+def test_format_widths_matches_format_dict():
+    data = parse(FORMATTED)
+    formatted = format_widths(data, [44, 72, 100, 20])
+
+    assert list(formatted) == [44, 72, 100, 20]
+    for width, text in formatted.items():
+        assert text == format_dict(data, max_line_length=width)
+
+
+def test_chunk_wrapper_matches_textwrap():
+    texts = [
+        "Id ipsum elit tempor non incididunt laborum anim dolore eu fugiat.",
+        "well-known  double  spaces,\ttabs and a_very_long_unbreakable_word_here",
+        "   leading and trailing   ",
+        "",
+    ]
+    for width in (1, 10, 20, 44, 100):
+        wrapper = textwrap.TextWrapper(
+            width=width, break_long_words=False, break_on_hyphens=False
+        )
+        for text in texts:
+            assert _wrap_uncached(text, width) == (tuple(wrapper.wrap(text)) or ("",))
+
+
+def test_is_formatted_accepts_formatted_sheets():
+    for width in (20, 44, 72):
+        formatted = format_str(FORMATTED, width)
+        assert Formatter(width).is_formatted(formatted)
+        assert not Formatter(width + 1).is_formatted(formatted)
+    assert Formatter().is_formatted("age --- 99")
+    assert Formatter().is_formatted(f"memories {'-' * 34}\n  >")
+
+
+def test_is_formatted_leaves_anything_else_to_the_formatter():
+    formatter = Formatter()
+    lines = FORMATTED.split("\n")
+    pair = lines.index("age ------- 99")
+    text = lines.index(f"description {'-' * 31}")
+
+    def block(key, *content):
+        return ["", f"{key} {'-' * (42 - len(key))}", *content]
+
+    changes = [
+        # surrounding and doubled blank lines, trailing spaces
+        lambda lines: [""] + lines,
+        lambda lines: lines[:4] + [""] + lines[4:],
+        lambda lines: lines[:pair] + [lines[pair] + " "] + lines[pair + 1 :],
+        # unsorted or misaligned pairs
+        lambda lines: lines[:pair] + [lines[pair + 1], lines[pair]] + lines[pair + 2 :],
+        lambda lines: lines[:pair] + ["age -- 99"] + lines[pair + 1 :],
+        # an empty value, a repeated key, a name outside the box
+        lambda lines: lines + block("empty"),
+        lambda lines: lines + block("age", "  a b c d e f"),
+        lambda lines: lines + block("name", "  a b c d e f"),
+        # block lines that read as a pair or a list item, or that could hold more
+        lambda lines: (
+            lines[: text + 1] + ["  not -- a pair but text"] + lines[text + 2 :]
+        ),
+        lambda lines: lines[: text + 1] + ["  > not a list item"] + lines[text + 2 :],
+        lambda lines: lines[: text + 1] + ["  Id", "  ipsum"] + lines[text + 2 :],
+        # short text that is written as a pair
+        lambda lines: lines[: text + 1] + ["  Id ipsum"] + lines[text + 3 :],
+    ]
+    assert formatter.is_formatted("\n".join(lines + block("other", "  a b c d e f")))
+    for change in changes:
+        changed = "\n".join(change(list(lines)))
+        assert changed != FORMATTED
+        assert not formatter.is_formatted(changed)
+        assert format_str(changed) == formatter.format(parse(changed))
+
+
+def test_format_str_returns_formatted_input_as_it_is():
+    text = FORMATTED + "\n"
+
+    assert format_str(text) == FORMATTED
+    assert format_str(text) == Formatter().format(parse(text))
+
+
+def test_format_str_counts_words_like_the_formatter():
+    # a no-break space separates words for str.split, so five words here
+    text = f"notes {'-' * 37}\n  one two three four \xa0 five"
+
+    assert format_str(text) == format_dict(parse(text))
+    assert format_str(text) == "notes --- one two three four \xa0 five"
+
+
+def test_format_str_fast_path_matches_the_formatter():
+    import random
+
+    rng = random.Random(0)
+    words = ["Id", "ipsum", "elit", "-", ">", "a--b", "x" * 30, "é", "k -- v", "  "]
+
+    def text(most):
+        return " ".join(rng.choice(words) for _ in range(rng.randint(0, most)))
+
+    for _ in range(500):
+        width = rng.choice([12, 20, 44])
+        data = {"name": text(3)} if rng.random() < 0.5 else {}
+        for key in rng.sample(["age", "ilk", "notes", "memories"], rng.randint(0, 4)):
+            data[key] = [text(12) for _ in range(2)] if key == "memories" else text(12)
+        formatted = format_dict(data, width)
+        lines = formatted.split("\n")
+        line = rng.randrange(len(lines))
+        lines[line] = lines[line].replace(" ", rng.choice(["", "  ", " -"]), 1)
+
+        for case in (formatted, "\n".join(lines)):
+            assert format_str(case, width) == format_dict(parse(case), width)
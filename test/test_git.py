@@ -0,0 +1,90 @@
+import subprocess
+import sys
+
+import pytest
+
+from cloacal.format import format_str
+from cloacal.git import GitError, changed_files
+
+UGLY = "age -- 99\nilk - bird\n"
+
+
+def git(repo, *args):
+    subprocess.run(
+        ["git", "-c", "user.name=t", "-c", "user.email=t@t", *args],
+        cwd=repo,
+        check=True,
+        capture_output=True,
+    )
+
+
+@pytest.fixture
+def repo(tmp_path):
+    git(tmp_path, "init", "-q")
+    (tmp_path / "sheets").mkdir()
+    for name in ("sheets/a.clo", "sheets/b.clo", "c.clo", "notes.txt"):
+        (tmp_path / name).write_text(UGLY)
+    git(tmp_path, "add", ".")
+    git(tmp_path, "commit", "-q", "-m", "sheets")
+
+    (tmp_path / "sheets/a.clo").write_text(UGLY + "species - gull\n")
+    (tmp_path / "notes.txt").write_text("changed")
+    (tmp_path / "new.clo").write_text(UGLY)
+    (tmp_path / "c.clo").write_text(UGLY + "species - gull\n")
+    git(tmp_path, "add", "c.clo")
+    git(tmp_path, "rm", "-q", "sheets/b.clo")
+    return tmp_path
+
+
+def test_changed_files(repo):
+    assert changed_files(since="HEAD", cwd=repo) == ["c.clo", "new.clo", "sheets/a.clo"]
+    assert changed_files(staged=True, cwd=repo) == ["c.clo"]
+    assert changed_files(since="HEAD", pattern="sheets/*.clo", cwd=repo) == [
+        "sheets/a.clo"
+    ]
+    assert changed_files(since="HEAD", cwd=repo / "sheets") == ["a.clo"]
+
+
+def test_changed_files_recursive_patterns(repo):
+    (repo / "sheets/deep/er").mkdir(parents=True)
+    (repo / "sheets/deep/er/d.clo").write_text(UGLY)
+
+    assert changed_files(since="HEAD", pattern="sheets/**/*.clo", cwd=repo) == [
+        "sheets/a.clo",
+        "sheets/deep/er/d.clo",
+    ]
+    assert changed_files(since="HEAD", pattern="sheets/*.clo", cwd=repo) == [
+        "sheets/a.clo"
+    ]
+    assert changed_files(since="HEAD", pattern="**/d.clo", cwd=repo) == [
+        "sheets/deep/er/d.clo"
+    ]
+
+
+def test_changed_files_errors(repo, tmp_path_factory):
+    with pytest.raises(GitError):
+        changed_files(since="no-such-ref", cwd=repo)
+    with pytest.raises(GitError):
+        # an option, not a revision
+        changed_files(since="--output=out.txt", cwd=repo)
+    assert not (repo / "out.txt").exists()
+    with pytest.raises(GitError):
+        changed_files(since="HEAD", cwd=tmp_path_factory.mktemp("not-a-repo"))
+
+
+def test_format_changed_since(repo):
+    subprocess.run(
+        [sys.executable, "-m", "cloacal", "format", "--staged", "-o"],
+        cwd=repo,
+        check=True,
+    )
+    assert (repo / "c.clo").read_text() == format_str(UGLY + "species - gull\n")
+    assert (repo / "new.clo").read_text() == UGLY
+
+    subprocess.run(
+        [sys.executable, "-m", "cloacal", "format", "--changed-since", "HEAD", "-o"],
+        cwd=repo,
+        check=True,
+    )
+    assert (repo / "new.clo").read_text() == format_str(UGLY)
+    assert (repo / "sheets/a.clo").read_text() == format_str(UGLY + "species - gull\n")
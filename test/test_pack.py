@@ -0,0 +1,224 @@
+import subprocess
+import sys
+
+import pytest
+
+from cloacal.format import format_dict, format_str
+from cloacal.pack import (
+    Archive,
+    ArchiveError,
+    format_archive,
+    is_archive,
+    load_from_archive,
+    pack,
+    unpack,
+    write_archive,
+)
+from cloacal.parse import parse, parse_sheets
+
+
+def sheet(name, age):
+    return f"+--+\n| {name} |\n+--+\nage -- {age}\nilk - bird\n"
+
+
+@pytest.fixture
+def sheets(tmp_path):
+    (tmp_path / "cast").mkdir()
+    (tmp_path / "cast/a.clo").write_text(sheet("Carlisle", 99) + sheet("Bob", 3))
+    (tmp_path / "cast/b.clo").write_text(sheet("Evelyn", 28))
+    (tmp_path / "c.clo").write_text("age -- 1\n")
+    return tmp_path
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_pack_and_load(sheets, monkeypatch, compress):
+    monkeypatch.chdir(sheets)
+    archive_path = sheets / "cast.clopack"
+    count = pack(["cast/a.clo", "cast/b.clo", "c.clo"], archive_path, compress)
+
+    assert count == 4
+    assert is_archive(archive_path)
+    assert not is_archive(sheets / "c.clo")
+    assert load_from_archive(archive_path, "Evelyn") == parse(sheet("Evelyn", 28))
+    assert load_from_archive(archive_path, "") == parse("age -- 1")
+    with pytest.raises(KeyError):
+        load_from_archive(archive_path, "Nobody")
+
+    with Archive(archive_path) as archive:
+        assert len(archive) == 4
+        assert archive.names() == ["Carlisle", "Bob", "Evelyn", ""]
+        assert [entry.path for entry in archive.entries()] == [
+            "cast/a.clo",
+            "cast/a.clo",
+            "cast/b.clo",
+            "c.clo",
+        ]
+        # sheets that zlib would make bigger are stored as they are
+        assert any(entry.compressed for entry in archive.entries()) == compress
+
+
+def test_find_reads_only_a_few_records(tmp_path):
+    path = tmp_path / "many.clopack"
+    names = [f"n{i:05}" for i in range(5000)]
+    write_archive(path, ((name, "x.clo", f"age -- {name}") for name in names))
+
+    with Archive(path) as archive:
+        reads = 0
+        record = archive._record
+
+        def counting(i):
+            nonlocal reads
+            reads += 1
+            return record(i)
+
+        archive._record = counting
+        assert archive.read(archive.find("n03117")) == "age -- n03117"
+        assert reads <= 15
+
+
+def test_unpack(sheets, monkeypatch, tmp_path_factory):
+    monkeypatch.chdir(sheets)
+    pack(["cast/a.clo", "cast/b.clo"], "cast.clopack")
+    target = tmp_path_factory.mktemp("out")
+
+    assert sorted(unpack("cast.clopack", target)) == [
+        str(target / "cast/a.clo"),
+        str(target / "cast/b.clo"),
+    ]
+    assert parse_sheets((target / "cast/a.clo").read_text()) == parse_sheets(
+        (sheets / "cast/a.clo").read_text()
+    )
+
+
+def test_pack_absolute_paths_round_trip(sheets, monkeypatch, tmp_path_factory):
+    monkeypatch.chdir(tmp_path_factory.mktemp("elsewhere"))
+    paths = sorted(str(path) for path in sheets.glob("**/*.clo"))
+    pack(paths, "cast.clopack")
+    target = tmp_path_factory.mktemp("out")
+
+    with Archive("cast.clopack") as archive:
+        assert [entry.path for entry in archive.entries()] == [
+            "c.clo",
+            "cast/a.clo",
+            "cast/a.clo",
+            "cast/b.clo",
+        ]
+    unpack("cast.clopack", target)
+    for name in ("c.clo", "cast/a.clo", "cast/b.clo"):
+        assert parse_sheets((target / name).read_text()) == parse_sheets(
+            (sheets / name).read_text()
+        )
+
+
+def test_unpack_refuses_paths_outside_the_target(tmp_path):
+    path = tmp_path / "evil.clopack"
+    write_archive(path, [("x", "../x.clo", "age -- 1")])
+
+    with pytest.raises(ArchiveError, match="outside"):
+        unpack(path, tmp_path / "out")
+
+
+def test_not_an_archive(tmp_path):
+    (tmp_path / "x.clo").write_text("age -- 1\n" * 10)
+
+    with pytest.raises(ArchiveError):
+        Archive(tmp_path / "x.clo")
+
+
+def corrupt(path, offset, data):
+    with open(path, "r+b") as f:
+        f.seek(offset)
+        f.write(data)
+
+
+def test_truncated_or_corrupt_archives(tmp_path):
+    path = tmp_path / "cast.clopack"
+    text = sheet("Bob", 3) * 20
+    write_archive(path, [("Bob", "b.clo", text)], compress=True)
+    data = path.read_bytes()
+
+    # a cut in the middle keeps the magic but not the trailer
+    path.write_bytes(data[: len(data) // 2])
+    with pytest.raises(ArchiveError, match="not a cloacal archive"):
+        Archive(path)
+    # a cut that keeps a copy of the trailer no longer fits it
+    path.write_bytes(data[:20] + data[-32:])
+    with pytest.raises(ArchiveError, match="corrupt"):
+        Archive(path)
+
+    path.write_bytes(data)
+    corrupt(path, 10, b"\xff" * 8)
+    with Archive(path) as archive, pytest.raises(ArchiveError, match="corrupt"):
+        archive.read(archive.find("Bob"))
+
+    # the first index record holds the sheet's offset
+    path.write_bytes(data)
+    with Archive(path) as archive:
+        index = archive._index
+    corrupt(path, index, (10**9).to_bytes(8, "little"))
+    with Archive(path) as archive, pytest.raises(ArchiveError, match="corrupt"):
+        list(archive)
+
+
+def test_format_archive_in_place(tmp_path):
+    path = tmp_path / "ugly.clopack"
+    write_archive(path, [("Bob", "b.clo", sheet("Bob", 3))], compress=True)
+
+    assert format_archive(path, width=30) == 1
+    with Archive(path) as archive:
+        [(entry, text)] = list(archive)
+    assert text == format_str(sheet("Bob", 3), 30)
+    assert entry.path == "b.clo"
+
+
+def test_cli_pack_unpack_and_format(sheets):
+    def cloacal(*args):
+        return subprocess.run(
+            [sys.executable, "-m", "cloacal", *args],
+            cwd=sheets,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+
+    cloacal("pack", "-f", "cast/*.clo", "-o", "cast.clopack", "--compress")
+    printed = cloacal("unpack", "-f", "cast.clopack", "--name", "Bob").stdout
+    assert printed == format_dict(parse(sheet("Bob", 3))) + "\n"
+
+    cloacal("format", "-f", "cast.clopack", "--width", "30", "-o")
+    assert load_from_archive(sheets / "cast.clopack", "Bob") == parse(sheet("Bob", 3))
+    with Archive(sheets / "cast.clopack") as archive:
+        assert archive.read(archive.find("Bob")) == format_str(sheet("Bob", 3), 30)
+
+
+def test_cli_format_archive_rejects_other_modes(sheets):
+    pack([str(sheets / "c.clo")], sheets / "c.clopack")
+    for option in ("--lines=1:1", "--daemon"):
+        result = subprocess.run(
+            [sys.executable, "-m", "cloacal", "format", "-f", "c.clopack", option],
+            cwd=sheets,
+            capture_output=True,
+            text=True,
+            check=False,
+        )
+        assert result.returncode == 2
+        assert "without --lines or --daemon" in result.stderr
+
+
+def test_cli_unpack_corrupt_archive(tmp_path):
+    path = tmp_path / "cast.clopack"
+    write_archive(path, [("Bob", "b.clo", sheet("Bob", 3))], compress=True)
+    corrupt(path, 10, b"\xff" * 8)
+
+    for command in ("unpack", "format"):
+        result = subprocess.run(
+            [sys.executable, "-m", "cloacal", command, "-f", "cast.clopack"],
+            cwd=tmp_path,
+            capture_output=True,
+            text=True,
+            check=False,
+        )
+        assert result.returncode == 1
+        assert "is corrupt" in result.stderr
+        assert "Traceback" not in result.stderr
+    assert [p.name for p in tmp_path.iterdir()] == ["cast.clopack"]
@@ -1,6 +1,6 @@
 from collections import OrderedDict
 
-from cloacal.parse import parse
+from cloacal.parse import parse, parse_sheets
 
 
 def test_parse_basic_input():
@@ -308,3 +308,56 @@ def test_parse_incorrect_indentation():
 
     result = parse(clo_input)
     assert result == expected_output
+
+
+def test_parse_sheets():
+    clo_input = """
++-------+
+| First |
++-------+
+
+age --- 1
+
+notes -----
+  Some notes.
++--------+
+| Second |
++--------+
+age --- 2
+
++-------+
+| Third |
++-------+
+    """
+
+    result = parse_sheets(clo_input)
+
+    assert result == [
+        OrderedDict({"name": "First", "age": "1", "notes": "Some notes."}),
+        OrderedDict({"name": "Second", "age": "2"}),
+        OrderedDict({"name": "Third"}),
+    ]
+    assert parse_sheets("") == []
+    assert parse_sheets("age -- 3") == [parse("age -- 3")]
+
+
+def test_parse_empty_block_lookback():
+    # an empty block is a list when a '>' marker is among the ten lines
+    # before its end, counted in the text without its surrounding newlines
+    pairs = "age -- 1\n" * 8
+    assert parse("d ---\n  > x\ne ---\n" + pairs)["e"] == ""
+    assert parse(pairs + "d ---\n  > x\ne ---\n" + pairs)["e"] == []
+    # in a text of fewer than ten lines a window starting before the text
+    # wraps around to the end of it
+    assert parse("d ---\n  > x\n" + "age -- 1\n" * 3 + "e ---")["e"] == ""
+    assert parse("d ---\n  > x\n" + "age -- 1\n" * 2 + "e ---")["e"] == []
+    # lines holding only whitespace are part of the text
+    assert parse(pairs + "d ---\n  > x\ne ---\n" + "  \n" * 9)["e"] == ""
+    assert parse(pairs + "d ---\n  > x\ne ---\n\n\n")["e"] == []
+
+
+def test_parse_sheets_matches_parse():
+    sheet = "+--+\n| Bob |\n+--+\nd ---\n  > x\ne ---\n" + "  \n" * 9
+    text = "\n" + sheet + "\n" + sheet.replace("Bob", "Eve")
+
+    assert parse_sheets(text) == [parse(sheet), parse(sheet.replace("Bob", "Eve"))]
@@ -0,0 +1,101 @@
+import pytest
+
+import cloacal
+from cloacal import source
+from cloacal.parse import parse
+from cloacal.source import open_lines
+
+EXAMPLE = """
++------------------------------------------+
+|                 Carlisle                 |
++------------------------------------------+
+
+age ------- 99
+ilk ------- bird
+species --- seagull
+
+description -------------------------------
+  Id ipsum elit tempor non incididunt
+  laborum anim dolore eu fugiat.
+
+memories ----------------------------------
+  > Consectetur ut qui Lorem ad.
+  > Veniam mollit nostrud velit laborum
+    veniam irure ut aute magna labore.
+"""
+
+
+@pytest.fixture
+def always_mmap(monkeypatch):
+    monkeypatch.setattr(source, "MMAP_THRESHOLD", 0)
+    # small chunks so that the tests cross chunk boundaries
+    monkeypatch.setattr(source.MappedLines, "CHUNK_SIZE", 16)
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        EXAMPLE,
+        EXAMPLE.strip(),
+        "\n\n" + EXAMPLE + "\n\n\n",
+        EXAMPLE.replace("\n", "\r\n"),
+        EXAMPLE.replace("\n", "\r"),
+        "\r\r" + EXAMPLE.replace("\n", "\r") + "\r\n\r",
+        "\n\n\n",
+        "age -- 99",
+        "name -- Ünïcødé\n  > ünïcødé ïtem\n",
+    ],
+)
+def test_mapped_lines_match_parse_lines(tmp_path, always_mmap, text):
+    path = tmp_path / "sheet.clo"
+    path.write_bytes(text.encode("utf-8"))
+
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    expected = text.strip("\n").split("\n")
+    with open_lines(str(path)) as lines:
+        assert isinstance(lines, source.MappedLines)
+        assert len(lines) == len(expected)
+        assert list(lines) == expected
+        assert lines[-1] == expected[-1]
+        assert lines[-3:5] == expected[-3:5]
+
+
+def test_small_files_are_read_into_memory(tmp_path):
+    path = tmp_path / "sheet.clo"
+    path.write_text(EXAMPLE)
+
+    with open_lines(str(path)) as lines:
+        assert isinstance(lines, list)
+        assert lines == EXAMPLE.strip("\n").split("\n")
+
+
+def test_old_mac_line_endings_read_the_same_mapped_or_not(tmp_path, monkeypatch):
+    path = tmp_path / "sheet.clo"
+    path.write_bytes(("\r" + EXAMPLE.replace("\n", "\r") * 3).encode())
+
+    with open_lines(str(path)) as lines:
+        assert isinstance(lines, list)
+        in_memory = list(lines)
+    monkeypatch.setattr(source, "MMAP_THRESHOLD", 0)
+    monkeypatch.setattr(source.MappedLines, "CHUNK_SIZE", 16)
+    with open_lines(str(path)) as lines:
+        assert isinstance(lines, source.MappedLines)
+        assert list(lines) == in_memory
+    assert in_memory[:2] == [
+        "+------------------------------------------+",
+        "|                 Carlisle                 |",
+    ]
+
+
+def test_empty_file(tmp_path, always_mmap):
+    path = tmp_path / "empty.clo"
+    path.write_text("")
+
+    assert cloacal.load(str(path)) == parse("")
+
+
+def test_load_mmap_matches_parse(tmp_path, always_mmap):
+    path = tmp_path / "sheet.clo"
+    path.write_text(EXAMPLE)
+
+    assert cloacal.load(str(path)) == parse(EXAMPLE)
@@ -1,7 +1,10 @@
-import pytest
+import io
 import tomllib
 
-from cloacal.toml2clo import toml2clo
+import pytest
+
+from cloacal.format import format_dict
+from cloacal.toml2clo import TomlSplitError, iter_toml2clo, split_tables, toml2clo
 
 
 def test_toml2clo_basic():
@@ -130,3 +133,73 @@ def test_toml2clo_invalid_toml():
 
     with pytest.raises(tomllib.TOMLDecodeError):
         toml2clo(toml_input)
+
+
+ROSTER = """
+# the roster
+["carlisle"]
+name = "Carlisle"
+age = 99
+memories = [
+    "Consectetur ut qui Lorem ad.",
+    ["nested", "array"],
+]
+
+[carlisle.extra]
+note = "subtables stay with their table"
+
+[evelyn]
+name = "Evelyn"
+description = '''
+[not a table]
+A clever fox with a knack for solving mysteries.'''
+notes = "a [bracket" # and a ] comment
+"""
+
+
+def test_split_tables():
+    tables = list(split_tables(io.StringIO(ROSTER)))
+
+    assert len(tables) == 2
+    assert tomllib.loads(tables[0]) == {"carlisle": tomllib.loads(ROSTER)["carlisle"]}
+    assert tomllib.loads(tables[1]) == {"evelyn": tomllib.loads(ROSTER)["evelyn"]}
+
+
+def test_iter_toml2clo_matches_toml2clo_per_table():
+    roster = ROSTER[ROSTER.index("[evelyn]") :] + '["zed"]\nname = "Zed"\nage = 3\n'
+    sheets = list(iter_toml2clo(io.StringIO(roster), max_line_length=30))
+
+    assert sheets == [
+        toml2clo(table, max_line_length=30)
+        for table in split_tables(io.StringIO(roster))
+    ]
+    assert len(sheets) == 2
+
+
+def test_iter_toml2clo_yields_before_reading_everything():
+    def lines():
+        yield '["one"]\n'
+        yield 'name = "One"\n'
+        yield '["two"]\n'
+        raise AssertionError("read past the second table header")
+
+    assert next(iter_toml2clo(lines())).splitlines()[1].strip("| ") == "One"
+
+
+def test_iter_toml2clo_falls_back_to_whole_document():
+    # keys outside of any table cannot be split, but parse as a whole
+    toml_input = 'carlisle = { name = "Carlisle", age = 99 }\n["evelyn"]\nage = 28\n'
+
+    assert list(iter_toml2clo(io.StringIO(toml_input))) == [
+        format_dict({"name": "Carlisle", "age": "99"}),
+        format_dict({"age": "28"}),
+    ]
+
+
+def test_iter_toml2clo_late_split_error():
+    toml_input = "[a]\nx = 1\n[b]\ny = 2\n[a.more]\nz = 3\n"
+    sheets = iter_toml2clo(io.StringIO(toml_input))
+
+    assert next(sheets) == format_dict({"x": "1"})
+    with pytest.raises(TomlSplitError, match="'a' is continued"):
+        list(sheets)